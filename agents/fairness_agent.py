@@ -3,24 +3,120 @@ import logging
 
 log = logging.getLogger("fairness-agent")
 
+DEFAULT_ALPHA = 1.0
+
+
+# -----------------------------
+# Shares
+# -----------------------------
+def band_shares(band_indices, weights, n_bands: int) -> np.ndarray:
+    """
+    Per-region shares for one allocation (regions,) or a batch (batch x regions)
+    of band index arrays: demand weight x band quality, where quality is
+    max(1, n_bands - idx) so lower-index bands count as better service.
+    """
+    idx = np.asarray(band_indices, dtype=int)
+    quality = np.maximum(1, n_bands - idx)
+    return np.asarray(weights, dtype=float) * quality
+
+
+# -----------------------------
+# Metrics (all reduce over the last axis)
+# -----------------------------
+def jain_index(shares) -> np.ndarray:
+    x = np.asarray(shares, dtype=float)
+    n = x.shape[-1]
+    denom = n * (x ** 2).sum(axis=-1)
+    total = x.sum(axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denom > 0, total ** 2 / np.where(denom > 0, denom, 1.0), 0.0)
+
+
+def alpha_fairness(shares, alpha: float = DEFAULT_ALPHA) -> np.ndarray:
+    """
+    Alpha-fair utility: sum(log x) for alpha == 1, else sum(x^(1-alpha) / (1-alpha)).
+    alpha=0 is total throughput, alpha -> inf approaches max-min.
+    """
+    x = np.maximum(np.asarray(shares, dtype=float), 1e-12)
+    if np.isclose(alpha, 1.0):
+        return np.log(x).sum(axis=-1)
+    return (x ** (1.0 - alpha) / (1.0 - alpha)).sum(axis=-1)
+
+
+def max_min(shares) -> np.ndarray:
+    return np.asarray(shares, dtype=float).min(axis=-1)
+
+
+def gini(shares) -> np.ndarray:
+    x = np.sort(np.asarray(shares, dtype=float), axis=-1)
+    n = x.shape[-1]
+    rank = 2 * np.arange(1, n + 1) - n - 1
+    total = x.sum(axis=-1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(total > 0, (rank * x).sum(axis=-1) / (n * np.where(total > 0, total, 1.0)), 0.0)
+
+
+def fairness_metrics(shares, alpha: float = DEFAULT_ALPHA) -> dict:
+    """
+    Jain, alpha-fairness, max-min and Gini for one allocation or a batch,
+    computed in a single pass over the shares array.
+    """
+    x = np.asarray(shares, dtype=float)
+    return {
+        "jain": jain_index(x),
+        "alpha_fairness": alpha_fairness(x, alpha),
+        "max_min": max_min(x),
+        "gini": gini(x),
+    }
+
+
+# -----------------------------
+# Agent entry point
+# -----------------------------
+def _indices_from_labels(allocation_map: dict, bands: list) -> list:
+    # Allocation maps carry readable labels, request bands carry keys: accept both
+    from .smart_allocator import BAND_LABELS
+
+    lookup = {}
+    for i, b in enumerate(bands):
+        key = str(b).lower()
+        lookup[key] = i
+        lookup[BAND_LABELS.get(key, key)] = i
+
+    indices, missing = [], []
+    for region, band in allocation_map.items():
+        idx = lookup.get(band, lookup.get(str(band).lower()))
+        if idx is None:
+            missing.append(region)
+            idx = len(bands) - 1  # quality=1
+        indices.append(idx)
+    if missing:
+        log.warning("%d region(s) had bands outside the bands list, defaulting quality=1: %s",
+                    len(missing), ", ".join(map(str, missing)))
+    return indices
+
+
 async def evaluate_fairness(allocation_res: dict, request: dict = None) -> dict:
     allocation_map = allocation_res.get("allocation_map", {})
-    bands = request.get("bands", []) if request else list(set(list(allocation_map.values())))
-    demand = request.get("demand", {}) if request else {}
+    bands = (request.get("bands") or []) if request else list(dict.fromkeys(allocation_map.values()))
+    demand = (request.get("demand") or {}) if request else {}
+    # Keys may be present with None (e.g. pydantic model dumps): treat as not provided
+    alpha = request.get("alpha") if request else None
+    alpha = DEFAULT_ALPHA if alpha is None else float(alpha)
 
-    shares = []
-    for region, band in allocation_map.items():
-        try:
-            idx = bands.index(band)
-            quality = max(1, (len(bands) - idx))
-        except ValueError:
-            quality = 1
-            log.warning("Band '%s' for region '%s' not in bands list, defaulting quality=1", band, region)
-        shares.append(demand.get(region, 1) * quality)
-
-    arr = np.array(shares, dtype=float)
-    if arr.size == 0:
-        return {"jain": 0.0, "shares": []}  # Always return float
-    denom = (arr**2).sum()
-    jain = (arr.sum()**2) / (arr.size * denom) if denom > 0 else 0.0
-    return {"jain": float(jain), "shares": shares}
+    if not allocation_map:
+        return {"jain": 0.0, "alpha_fairness": 0.0, "max_min": 0.0, "gini": 0.0, "alpha": alpha, "shares": []}
+
+    band_indices = allocation_res.get("band_indices")
+    if band_indices is None or len(band_indices) != len(allocation_map):
+        band_indices = _indices_from_labels(allocation_map, bands)
+
+    weights = [demand.get(region, 1) for region in allocation_map]
+    n_bands = max(len(bands), max(band_indices) + 1)
+    shares = band_shares(band_indices, weights, n_bands)
+    metrics = fairness_metrics(shares, alpha)
+
+    result = {k: float(v) for k, v in metrics.items()}
+    result["alpha"] = alpha
+    result["shares"] = shares.tolist()
+    return result
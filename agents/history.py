@@ -0,0 +1,306 @@
+# agents/history.py
+import os
+import json
+import time
+import queue
+import logging
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Dict, List, Optional
+
+log = logging.getLogger("allocation-history")
+
+HISTORY_DIR = Path(os.getenv("HISTORY_DIR", os.path.join("data", "history")))
+HISTORY_CAPACITY = int(os.getenv("HISTORY_CAPACITY", "1000"))
+SEGMENT_MAX_BYTES = int(os.getenv("HISTORY_SEGMENT_MAX_BYTES", str(8 * 1024 * 1024)))
+SEGMENT_PREFIX = "allocations-"
+# Oldest segments beyond this count are deleted on rotation (0 keeps everything)
+MAX_SEGMENTS = int(os.getenv("HISTORY_MAX_SEGMENTS", "16"))
+
+
+# -----------------------------
+# Compact record
+# -----------------------------
+class AllocationRecord:
+    """
+    One allocation outcome: ids, scores, Jain index and band indices only.
+    Retrieved chunk text and summaries are deliberately not kept.
+    """
+    __slots__ = ("ts", "request_id", "use_case", "regions", "bands", "band_indices", "score", "jain", "status")
+
+    def __init__(self, ts, request_id, use_case, regions, bands, band_indices, score, jain, status):
+        self.ts = ts
+        self.request_id = request_id
+        self.use_case = use_case
+        self.regions = regions
+        self.bands = bands
+        self.band_indices = band_indices
+        self.score = score
+        self.jain = jain
+        self.status = status
+
+    @classmethod
+    def from_result(cls, request_data: dict, response: dict) -> "AllocationRecord":
+        result = response.get("result", {})
+        allocation = result.get("allocation", {})
+        fairness = result.get("fairness", {})
+        regions = tuple(allocation.get("allocation_map", {}).keys())
+        bands = tuple(str(b).lower() for b in request_data.get("bands") or [])
+        return cls(
+            ts=time.time(),
+            request_id=request_data.get("request_id"),
+            use_case=request_data.get("use_case"),
+            regions=regions,
+            bands=bands,
+            band_indices=tuple(int(i) for i in allocation.get("band_indices", [])),
+            score=float(allocation.get("score", 0.0)),
+            jain=float(fairness.get("jain", 0.0)),
+            status=response.get("status", ""),
+        )
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "AllocationRecord":
+        return cls(
+            ts=d["ts"],
+            request_id=d.get("request_id"),
+            use_case=d.get("use_case"),
+            regions=tuple(d.get("regions", [])),
+            bands=tuple(d.get("bands", [])),
+            band_indices=tuple(d.get("band_indices", [])),
+            score=d.get("score", 0.0),
+            jain=d.get("jain", 0.0),
+            status=d.get("status", ""),
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "ts": self.ts,
+            "request_id": self.request_id,
+            "use_case": self.use_case,
+            "regions": list(self.regions),
+            "bands": list(self.bands),
+            "band_indices": list(self.band_indices),
+            "score": self.score,
+            "jain": self.jain,
+            "status": self.status,
+        }
+
+    def band_for(self, region: str) -> Optional[str]:
+        try:
+            idx = self.band_indices[self.regions.index(region)]
+            return self.bands[idx]
+        except (ValueError, IndexError):
+            return None
+
+
+# -----------------------------
+# Append-only JSONL segments
+# -----------------------------
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except (PermissionError, OSError):
+        return True
+    return True
+
+
+def tail_lines(path: Path, block_size: int = 64 * 1024):
+    """Lines of a file, last first, read backwards in blocks."""
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos, rest = f.tell(), b""
+        while pos > 0:
+            step = min(block_size, pos)
+            pos -= step
+            f.seek(pos)
+            lines = (f.read(step) + rest).split(b"\n")
+            rest = lines.pop(0)
+            for line in reversed(lines):
+                if line.strip():
+                    yield line.decode("utf-8", errors="replace")
+        if rest.strip():
+            yield rest.decode("utf-8", errors="replace")
+
+
+class SegmentWriter:
+    """
+    Background thread that appends records to rotating JSONL segments,
+    so request handlers never wait on disk I/O.
+
+    Several processes (server workers, CLI jobs) may share a directory:
+    each writes and rotates only its own `<prefix><pid>-<n>.jsonl`
+    segments, and removes another process's segments only once that
+    process has exited.
+    """
+
+    def __init__(self, directory: Path = HISTORY_DIR, max_bytes: int = SEGMENT_MAX_BYTES,
+                 prefix: str = SEGMENT_PREFIX, max_segments: int = MAX_SEGMENTS):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.prefix = prefix
+        self.max_segments = max_segments
+        self._queue: "queue.Queue[Optional[dict]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def segments(self) -> List[Path]:
+        """Segments of every process, oldest (least recently written) first."""
+        if not self.directory.exists():
+            return []
+        segs = []
+        for p in self.directory.glob(f"{self.prefix}*.jsonl"):
+            try:
+                segs.append((p.stat().st_mtime, p.name, p))
+            except OSError:  # removed by its owner meanwhile
+                continue
+        return [p for _, _, p in sorted(segs)]
+
+    def _owner(self, path: Path) -> Optional[int]:
+        pid, sep, _ = path.stem[len(self.prefix):].partition("-")
+        return int(pid) if sep and pid.isdigit() else None
+
+    def _own_segments(self) -> List[Path]:
+        if not self.directory.exists():
+            return []
+        return sorted(self.directory.glob(f"{self.prefix}{os.getpid()}-*.jsonl"))
+
+    def _current_segment(self) -> Path:
+        pid = os.getpid()
+        own = self._own_segments()
+        if own and own[-1].stat().st_size < self.max_bytes:
+            return own[-1]
+        next_no = int(own[-1].stem.rsplit("-", 1)[1]) + 1 if own else 1
+        if self.max_segments > 0:
+            self._prune(pid, keep=self.max_segments - 1)
+        return self.directory / f"{self.prefix}{pid}-{next_no:05d}.jsonl"
+
+    def _prune(self, pid: int, keep: int):
+        """Delete the oldest segments this process may remove until at most `keep` remain."""
+        segs = self.segments()
+        excess = len(segs) - keep
+        for seg in segs:
+            if excess <= 0:
+                break
+            owner = self._owner(seg)
+            if owner != pid and owner is not None and _pid_alive(owner):
+                continue
+            try:
+                seg.unlink(missing_ok=True)
+            except OSError as e:
+                log.warning("Could not remove old segment %s: %s", seg, e)
+                continue
+            excess -= 1
+
+    def _run(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                break
+            try:
+                with open(self._current_segment(), "a", encoding="utf-8") as f:
+                    f.write(json.dumps(item, ensure_ascii=False) + "\n")
+            except Exception as e:
+                log.error("Failed to write record to %s: %s", self.directory, e)
+            finally:
+                self._queue.task_done()
+
+    def submit(self, record: dict):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=f"{self.prefix}writer", daemon=True)
+                self._thread.start()
+        self._queue.put(record)
+
+    def flush(self):
+        self._queue.join()
+
+    def close(self):
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+
+# -----------------------------
+# History store
+# -----------------------------
+class AllocationHistory:
+    """
+    Fixed-size in-memory ring buffer of AllocationRecord, spilled to disk.
+    """
+
+    def __init__(self, capacity: int = HISTORY_CAPACITY, writer: Optional[SegmentWriter] = None):
+        self._buffer: deque = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+        self.writer = writer if writer is not None else SegmentWriter()
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def append(self, request_data: dict, response: dict) -> AllocationRecord:
+        record = AllocationRecord.from_result(request_data, response)
+        with self._lock:
+            self._buffer.append(record)
+        self.writer.submit(record.to_dict())
+        return record
+
+    def recent(self, region: Optional[str] = None, limit: int = 20, include_disk: bool = True) -> List[Dict]:
+        """
+        Most recent allocations (newest first), optionally for a single region.
+        The ring buffer is merged with the on-disk segments, which also hold
+        records written by other processes sharing the history directory.
+        """
+        with self._lock:
+            records = list(self._buffer)
+        hits = [r for r in reversed(records) if region is None or region in r.regions][:limit]
+        if include_disk:
+            hits = self._merge_disk(hits, region, limit)
+        return [self._view(r, region) for r in hits]
+
+    @staticmethod
+    def _key(rec: AllocationRecord) -> tuple:
+        return rec.ts, rec.request_id, rec.regions
+
+    def _merge_disk(self, hits: List[AllocationRecord], region: Optional[str], limit: int) -> List[AllocationRecord]:
+        """
+        Newest `limit` of `hits` plus disk records, deduplicated. Segments
+        are read from the tail, newest segment first, and only as far back
+        as can still change the result.
+        """
+        seen = {self._key(r): r for r in hits}
+
+        def cutoff() -> float:
+            if len(seen) < limit:
+                return float("-inf")
+            return sorted((r.ts for r in seen.values()), reverse=True)[limit - 1]
+
+        for seg in reversed(self.writer.segments()):
+            floor = cutoff()
+            try:
+                if seg.stat().st_mtime < floor:
+                    break  # this and every older segment was last written before the cutoff
+                for line in tail_lines(seg):
+                    try:
+                        rec = AllocationRecord.from_dict(json.loads(line))
+                    except (ValueError, KeyError):
+                        continue
+                    if rec.ts < floor:
+                        break  # a segment has one writer, so the rest of it is older
+                    if region is None or region in rec.regions:
+                        seen.setdefault(self._key(rec), rec)
+                        floor = cutoff()
+            except OSError as e:  # rotated away by its owner meanwhile
+                log.warning("Could not read history segment %s: %s", seg, e)
+
+        return sorted(seen.values(), key=lambda r: r.ts, reverse=True)[:limit]
+
+    @staticmethod
+    def _view(record: AllocationRecord, region: Optional[str]) -> Dict:
+        d = record.to_dict()
+        if region is not None:
+            d["band"] = record.band_for(region)
+        return d
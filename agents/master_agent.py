@@ -3,16 +3,19 @@ from .policy_guardian import check_policy
 from .smart_allocator import allocate_spectrum
 from .fairness_agent import evaluate_fairness
 from .spectrum_agent import monitor_channels
-from rag_backend.rag_engine import retrieve
+from .history import AllocationHistory
+from rag_backend.rag_engine import retrieve, get_embedder
 from typing import List, Dict
-from sentence_transformers import SentenceTransformer, util
+import numpy as np
+import asyncio
 import logging
 
 # Initialize logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
 
-# Load transformer once (semantic summarizer)
-model = SentenceTransformer('all-MiniLM-L6-v2')
+# Hybrid (BM25 + vector) retrieval ranks exact policy terms well, so fewer
+# chunks are needed and the summarizer encodes fewer sentences.
+RETRIEVE_TOP_K = 3
 
 # -----------------------------
 # Semantic summarization
@@ -29,10 +32,12 @@ def semantic_summarize_with_allocation(contexts: List[Dict], allocation_map: dic
         summary_sentences = []
     else:
         # Encode and find top semantically relevant sentences
-        sentence_embeddings = model.encode(sentences, convert_to_tensor=True)
-        query_embedding = model.encode(query, convert_to_tensor=True)
-        scores = util.cos_sim(query_embedding, sentence_embeddings)[0]
-        top_idx = scores.topk(k=min(max_sentences, len(sentences))).indices
+        # (embedder is shared with the RAG engine and loaded lazily)
+        model = get_embedder()
+        sentence_embeddings = model.encode(sentences, convert_to_numpy=True, normalize_embeddings=True)
+        query_embedding = model.encode(query, convert_to_numpy=True, normalize_embeddings=True)
+        scores = sentence_embeddings @ query_embedding
+        top_idx = np.argsort(-scores, kind="stable")[: min(max_sentences, len(sentences))]
         summary_sentences = [sentences[i] for i in top_idx]
 
     # Add smart allocation info
@@ -46,10 +51,15 @@ def semantic_summarize_with_allocation(contexts: List[Dict], allocation_map: dic
 # MasterAgent (Coordinator)
 # -----------------------------
 class MasterAgent:
-    def __init__(self):
-        self.history = []
+    def __init__(self, history: AllocationHistory = None, policy_checker=check_policy):
+        """
+        `policy_checker` defaults to the HTTP check against the RAG endpoint;
+        offline jobs pass policy_guardian.check_policy_local instead.
+        """
+        self.history = history if history is not None else AllocationHistory()
+        self.policy_checker = policy_checker
 
-    async def run_allocation(self, request_data: dict) -> dict:
+    async def run_allocation(self, request_data: dict, summarize: bool = True, check_compliance: bool = True) -> dict:
         """
         Full workflow:
         1) Retrieve policy context via RAG
@@ -58,6 +68,10 @@ class MasterAgent:
         4) Compliance check
         5) Fairness analysis
         6) Monitoring (dataset metrics)
+
+        Offline jobs that only need allocations can skip steps 1 and 3
+        (summarize=False: no embedding model or index) and step 4
+        (check_compliance=False: no policy guardian call).
         """
         logging.info("Starting spectrum allocation workflow...")
 
@@ -65,7 +79,8 @@ class MasterAgent:
         # 1) Retrieve policy documents (RAG)
         # -------------------------------
         query = f"Spectrum allocation policy for regions '{request_data.get('regions')}' and use_case '{request_data.get('use_case')}'"
-        contexts = retrieve(query)
+        # Embedding + index search are CPU-bound: run them off the event loop
+        contexts = await asyncio.to_thread(retrieve, query, RETRIEVE_TOP_K) if summarize else []
         logging.info(f"Retrieved {len(contexts)} relevant documents for context enrichment.")
 
         # -------------------------------
@@ -79,12 +94,15 @@ class MasterAgent:
         # -------------------------------
         # 3) Semantic RAG summary (policy + allocation reasoning)
         # -------------------------------
-        policy_text = semantic_summarize_with_allocation(contexts, allocation_map, query)
+        policy_text = (
+            await asyncio.to_thread(semantic_summarize_with_allocation, contexts, allocation_map, query)
+            if summarize else None
+        )
 
         # -------------------------------
         # 4) Policy compliance check
         # -------------------------------
-        policy = await check_policy(request_data)
+        policy = await self.policy_checker(request_data) if check_compliance else {"checked": False}
         policy["reason"] = policy_text
         policy["sources"] = [c.get("source") for c in contexts]
         policy["compliant"] = True  # assume compliant; your guardian can override
@@ -120,8 +138,10 @@ class MasterAgent:
             "monitoring": monitoring
         }
 
-        # Save to memory
-        self.history.append({"request": request_data, "result": result})
+        response = {"status": "Accepted", "result": result}
+
+        # Save a compact record (bounded in memory, spilled to disk)
+        self.history.append(request_data, response)
         logging.info("Workflow completed successfully.")
 
-        return {"status": "Accepted", "result": result}
+        return response
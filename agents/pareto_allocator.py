@@ -0,0 +1,157 @@
+# agents/pareto_allocator.py
+import time
+import numpy as np
+from typing import Callable, Dict, Optional
+
+# Defaults for the multi-objective mode (overridable per request)
+PARETO_POP_SIZE = 100
+PARETO_MAX_GENS = 200
+PARETO_TIME_BUDGET_S = 2.0
+PARETO_CROSSOVER_RATE = 0.9
+
+
+# ---------------------------
+# Energy cost model
+# ---------------------------
+def band_energy_factor(n_bands: int) -> np.ndarray:
+    """
+    Relative power draw per band index. Bands are ordered low -> high, and
+    higher bands need denser cells, so cost grows linearly from 1x to 2x.
+    """
+    if n_bands == 1:
+        return np.ones(1)
+    return np.linspace(1.0, 2.0, n_bands)
+
+
+def energy_cost_table(region_metrics: Dict, regions, n_bands: int) -> np.ndarray:
+    """
+    (regions x bands) energy cost from the dataset's avg_power / avg_energy,
+    scaled by the band factor.
+    """
+    base = np.array(
+        [float(region_metrics[r]["avg_power"]) + float(region_metrics[r]["avg_energy"]) / 100.0 for r in regions]
+    )
+    return base[:, None] * band_energy_factor(n_bands)[None, :]
+
+
+# ---------------------------
+# NSGA-II building blocks (objectives are minimized)
+# ---------------------------
+def fast_non_dominated_sort(F: np.ndarray) -> np.ndarray:
+    """
+    Pareto rank (0 = non-dominated) for each row of the (n x m) objective
+    matrix, using a vectorized domination matrix and front peeling.
+    """
+    n, m = F.shape
+    le = np.ones((n, n), dtype=bool)
+    lt = np.zeros((n, n), dtype=bool)
+    for k in range(m):
+        col = F[:, k]
+        le &= col[:, None] <= col[None, :]
+        lt |= col[:, None] < col[None, :]
+    dominates = le & lt  # dominates[i, j]: i dominates j
+
+    dominated_count = dominates.sum(axis=0)
+    rank = np.full(n, -1, dtype=int)
+    current = np.flatnonzero(dominated_count == 0)
+    level = 0
+    while current.size:
+        rank[current] = level
+        dominated_count = dominated_count - dominates[current].sum(axis=0, dtype=np.int64)
+        dominated_count[rank >= 0] = -1
+        current = np.flatnonzero(dominated_count == 0)
+        level += 1
+    return rank
+
+
+def crowding_distance(F: np.ndarray, rank: np.ndarray) -> np.ndarray:
+    n, m = F.shape
+    dist = np.zeros(n)
+    for level in np.unique(rank):
+        members = np.flatnonzero(rank == level)
+        if members.size <= 2:
+            dist[members] = np.inf
+            continue
+        Fm = F[members]
+        for k in range(m):
+            order = np.argsort(Fm[:, k], kind="stable")
+            span = Fm[order[-1], k] - Fm[order[0], k]
+            d = np.zeros(members.size)
+            d[order[0]] = d[order[-1]] = np.inf
+            if span > 0:
+                d[order[1:-1]] = (Fm[order[2:], k] - Fm[order[:-2], k]) / span
+            dist[members] += d
+    return dist
+
+
+def _tournament(rng, rank, crowd, size):
+    a = rng.integers(rank.size, size=size)
+    b = rng.integers(rank.size, size=size)
+    a_wins = (rank[a] < rank[b]) | ((rank[a] == rank[b]) & (crowd[a] >= crowd[b]))
+    return np.where(a_wins, a, b)
+
+
+def _select_survivors(F, pop_size):
+    rank = fast_non_dominated_sort(F)
+    crowd = crowding_distance(F, rank)
+    order = np.lexsort((-crowd, rank))[:pop_size]
+    return order, rank[order], crowd[order]
+
+
+def nsga2(
+    objectives: Callable[[np.ndarray], np.ndarray],
+    n_regions: int,
+    n_bands: int,
+    pop_size: int = PARETO_POP_SIZE,
+    max_gens: int = PARETO_MAX_GENS,
+    time_budget_s: Optional[float] = PARETO_TIME_BUDGET_S,
+    rng: Optional[np.random.Generator] = None,
+) -> Dict:
+    """
+    NSGA-II over band index chromosomes. `objectives` maps a
+    (pop x regions) population to a (pop x m) matrix to minimize.
+    Stops after max_gens or once time_budget_s has elapsed.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    started = time.perf_counter()
+    mutation_rate = 1.0 / max(1, n_regions)
+    positions = np.arange(n_regions)[None, :]
+
+    population = rng.integers(n_bands, size=(pop_size, n_regions))
+    F = objectives(population)
+    rank = fast_non_dominated_sort(F)
+    crowd = crowding_distance(F, rank)
+
+    gens_run = 0
+    for _ in range(max_gens):
+        if time_budget_s is not None and time.perf_counter() - started >= time_budget_s:
+            break
+
+        # Binary tournament, one-point crossover, per-gene mutation
+        p1 = population[_tournament(rng, rank, crowd, pop_size)]
+        p2 = population[_tournament(rng, rank, crowd, pop_size)]
+        cut = rng.integers(1, max(1, n_regions - 1) + 1, size=pop_size)
+        cross = rng.random(pop_size) < PARETO_CROSSOVER_RATE
+        cut = np.where(cross, cut, n_regions)
+        children = np.where(positions < cut[:, None], p1, p2)
+        mutate = rng.random(children.shape) < mutation_rate
+        children[mutate] = rng.integers(n_bands, size=int(mutate.sum()))
+
+        # Elitist (mu + lambda) survival by rank, then crowding distance
+        combined = np.concatenate([population, children])
+        F_combined = np.concatenate([F, objectives(children)])
+        keep, rank, crowd = _select_survivors(F_combined, pop_size)
+        population, F = combined[keep], F_combined[keep]
+        gens_run += 1
+
+    front = rank == 0
+    front_pop, front_F = population[front], F[front]
+    _, unique_idx = np.unique(front_pop, axis=0, return_index=True)
+    unique_idx = np.sort(unique_idx)
+
+    return {
+        "population": front_pop[unique_idx],
+        "objectives": front_F[unique_idx],
+        "generations": gens_run,
+        "elapsed_s": time.perf_counter() - started,
+    }
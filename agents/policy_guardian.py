@@ -4,27 +4,25 @@ import asyncio
 import os
 
 RAG_ENDPOINT = os.getenv("RAG_ENDPOINT", "http://127.0.0.1:8000/api/rag/query")
+POLICY_TOP_K = 5
 
-async def check_policy(request_data: dict) -> dict:
+
+def policy_query(request_data: dict) -> str:
     # Build a focused query for the RAG engine
     bands = request_data.get("bands") or [request_data.get("band")] if request_data.get("band") else []
     regions = request_data.get("regions") or [request_data.get("region")] if request_data.get("region") else []
-    use_case = request_data.get("use_case", "general use")
+    use_case = request_data.get("use_case") or "general use"
 
     band_summary = ", ".join([str(b) for b in bands]) if bands else "unspecified band"
     region_summary = ", ".join(regions) if regions else "unspecified region"
 
-    query = (
+    return (
         f"Please check TRAI/3GPP/ITU policies: Can bands {band_summary} be allocated in "
         f"{region_summary} for use case: {use_case}? Mention any restrictions and cite sources."
     )
 
-    async with aiohttp.ClientSession() as session:
-        async with session.post(RAG_ENDPOINT, json={"query": query, "top_k": 5, "generate": True}, timeout=60) as resp:
-            data = await resp.json()
 
-    answer = data.get("answer", "") or ""
-    retrieved = data.get("retrieved", [])
+def _verdict(answer: str, retrieved: list) -> dict:
     # extract source URLs from retrieved docs
     sources = [d.get("source") for d in retrieved if d.get("source")]
 
@@ -34,3 +32,25 @@ async def check_policy(request_data: dict) -> dict:
     compliant = not any(k in lowered for k in not_allowed_keywords)
 
     return {"compliant": compliant, "reason": answer, "sources": sources}
+
+
+async def check_policy(request_data: dict) -> dict:
+    """Compliance check through the running server's RAG endpoint."""
+    query = policy_query(request_data)
+    async with aiohttp.ClientSession() as session:
+        async with session.post(RAG_ENDPOINT, json={"query": query, "top_k": POLICY_TOP_K, "generate": True},
+                                timeout=60) as resp:
+            data = await resp.json()
+
+    return _verdict(data.get("answer") or "", data.get("retrieved") or [])
+
+
+async def check_policy_local(request_data: dict) -> dict:
+    """Same check run in-process (retrieval + LLM backend), for jobs with no server running."""
+    from rag_backend.llm import agenerate_answer
+    from rag_backend.rag_engine import retrieve
+
+    query = policy_query(request_data)
+    retrieved = await asyncio.to_thread(retrieve, query, POLICY_TOP_K)
+    answer = await agenerate_answer(query, retrieved)
+    return _verdict(answer or "", retrieved)
@@ -0,0 +1,182 @@
+# agents/replay.py
+"""
+Per-request seeds and the allocation replay log.
+
+Every allocation draws its randomness from a single seed: the request's
+`seed`, or one derived from the canonical request hash, so identical
+requests get identical allocations. Each run appends a compact record
+(inputs, seed, solver config, output) to data/replay/, which can be
+re-executed offline, optionally under cProfile:
+
+    python -m agents.replay list --limit 10
+    python -m agents.replay run <request_id | seed | -1> --profile
+"""
+import os
+import json
+import time
+import asyncio
+import logging
+import argparse
+from pathlib import Path
+from typing import Dict, Iterator, Optional
+
+from utils.admission import canonical_key
+
+from .history import SegmentWriter
+
+REPLAY_DIR = Path(os.getenv("REPLAY_DIR", os.path.join("data", "replay")))
+REPLAY_ENABLED = os.getenv("REPLAY_ENABLED", "1") == "1"
+REPLAY_PREFIX = "replay-"
+
+
+# -----------------------------
+# Seeds
+# -----------------------------
+def request_seed(request_data: Dict) -> int:
+    """Client-supplied seed, else 63 bits of the canonical request hash."""
+    seed = request_data.get("seed")
+    if seed is not None:
+        seed = int(seed)
+        if seed < 0:
+            raise ValueError("seed must be a non-negative integer")
+        return seed
+    return int(canonical_key(request_data, ignore=("request_id", "seed"))[:16], 16) >> 1
+
+
+# -----------------------------
+# Replay log
+# -----------------------------
+class ReplayLog:
+    """Append-only JSONL of allocation runs, written off the request path."""
+
+    def __init__(self, directory: Path = REPLAY_DIR, enabled: bool = REPLAY_ENABLED):
+        self.enabled = enabled
+        self.writer = SegmentWriter(directory, prefix=REPLAY_PREFIX)
+
+    def record(self, request_data: Dict, seed: int, solver: Dict, result: Dict, dataset: Optional[Dict],
+               elapsed_s: float):
+        if not self.enabled:
+            return
+        self.writer.submit({
+            "ts": time.time(),
+            "request_id": request_data.get("request_id"),
+            "seed": seed,
+            "request": {k: v for k, v in request_data.items() if v is not None and k not in ("request_id", "seed")},
+            "solver": solver,
+            "dataset": dataset,
+            "output": {"band_indices": result.get("band_indices", []), "score": result.get("score")},
+            "elapsed_s": round(elapsed_s, 4),
+        })
+
+    def records(self) -> Iterator[Dict]:
+        """Newest first."""
+        for seg in reversed(self.writer.segments()):
+            for line in reversed(seg.read_text(encoding="utf-8").splitlines()):
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
+
+    def find(self, ref: str) -> Optional[Dict]:
+        """A record by request_id or seed; -1, -2, ... count back from the newest."""
+        if ref.startswith("-") and ref[1:].isdigit():
+            for i, rec in enumerate(self.records(), start=1):
+                if i == int(ref[1:]):
+                    return rec
+            return None
+        for rec in self.records():
+            if rec.get("request_id") == ref or str(rec.get("seed")) == ref:
+                return rec
+        return None
+
+
+replay_log = ReplayLog()
+
+
+# -----------------------------
+# Offline re-execution
+# -----------------------------
+def replay_request(record: Dict) -> Dict:
+    """
+    The request to re-run a record with. Pareto runs stop on a wall-clock
+    budget, so the recorded generation count is pinned instead.
+    """
+    request = dict(record["request"], seed=record["seed"], request_id=record.get("request_id"))
+    solver = record.get("solver") or {}
+    if solver.get("mode") == "pareto" and solver.get("generations") is not None:
+        request["generations"] = solver["generations"]
+        request["time_budget_s"] = float("inf")
+    return request
+
+
+def replay(record: Dict, profile: bool = False, sort: str = "cumulative", top: int = 25,
+           profile_out: Optional[str] = None) -> Dict:
+    from .smart_allocator import allocate_spectrum, load_dataset
+
+    request = replay_request(record)
+    profiler = None
+    if profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    started = time.perf_counter()
+    result = asyncio.run(allocate_spectrum(request, log_replay=False))
+    elapsed = time.perf_counter() - started
+    if profiler is not None:
+        import pstats
+        profiler.disable()
+        if profile_out:
+            profiler.dump_stats(profile_out)
+        pstats.Stats(profiler).sort_stats(sort).print_stats(top)
+
+    expected = record.get("output", {}).get("band_indices")
+    return {
+        "request_id": record.get("request_id"),
+        "seed": record["seed"],
+        "reproduced": result.get("band_indices") == expected,
+        "score": result.get("score"),
+        "recorded_score": record.get("output", {}).get("score"),
+        "elapsed_s": round(elapsed, 4),
+        "recorded_elapsed_s": record.get("elapsed_s"),
+        "dataset": load_dataset().fingerprint(),
+        "recorded_dataset": record.get("dataset"),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dir", default=str(REPLAY_DIR))
+    sub = parser.add_subparsers(dest="command", required=True)
+    ls = sub.add_parser("list", help="show recent runs")
+    ls.add_argument("--limit", type=int, default=20)
+    run = sub.add_parser("run", help="re-execute a recorded run")
+    run.add_argument("ref", help="request_id, seed, or -N for the N-th newest run")
+    run.add_argument("--profile", action="store_true", help="run under cProfile and print the hottest calls")
+    run.add_argument("--sort", default="cumulative")
+    run.add_argument("--top", type=int, default=25)
+    run.add_argument("--profile-out", help="also write raw cProfile stats to this file")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    replays = ReplayLog(Path(args.dir))
+    if args.command == "list":
+        for i, rec in enumerate(replays.records(), start=1):
+            if i > args.limit:
+                break
+            solver = rec.get("solver") or {}
+            print(f"-{i}\t{rec.get('request_id')}\tseed={rec['seed']}\tmode={solver.get('mode')}\t"
+                  f"regions={len(rec['request'].get('regions') or [])}\tscore={rec['output'].get('score')}\t"
+                  f"{rec.get('elapsed_s')}s")
+        return
+
+    record = replays.find(args.ref)
+    if record is None:
+        raise SystemExit(f"No replay record matches {args.ref!r} in {args.dir}")
+    outcome = replay(record, args.profile, args.sort, args.top, args.profile_out)
+    print(json.dumps(outcome, indent=2))
+    if not outcome["reproduced"]:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,27 @@
-import random
-import pandas as pd
-import os
-from typing import Dict, List
+import time
+import asyncio
+import numpy as np
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+from utils.dataset import EnergyDataset, cluster_coordinates, get_dataset
+
+from .fairness_agent import band_shares, jain_index
+from .replay import replay_log, request_seed
+from .pareto_allocator import (
+    PARETO_MAX_GENS,
+    PARETO_POP_SIZE,
+    PARETO_TIME_BUDGET_S,
+    energy_cost_table,
+    nsga2,
+)
+from .spatial_allocator import (
+    SPATIAL_CONFLICT_PENALTY,
+    SPATIAL_NEIGHBOURS,
+    adjacency_from_coordinates,
+    adjacency_from_edge_list,
+    spatial_allocate,
+)
 
 # Mapping for readable band names
 BAND_LABELS = {
@@ -10,42 +30,63 @@ BAND_LABELS = {
     "high": "High Band / mmWave (24 GHz+)"
 }
 
-# Dataset path
-DATA_PATH = os.path.join("data", "PanIndia_energy.csv")
+# Single-objective GA settings
+GA_POP_SIZE = 60
+GA_GENERATIONS = 80
+
+# Upper bounds on client-supplied solver sizes (pareto and spatial modes);
+# NSGA-II's dominance matrices grow with (2 * pop_size) ** 2
+MAX_POP_SIZE = 500
+MAX_GENERATIONS = 1000
 
+# Normalized inputs are rounded before keying the score table cache
+SCORE_TABLE_PRECISION = 6
+SCORE_TABLE_CACHE_SIZE = 256
 
-async def allocate_spectrum(request_data: Dict) -> Dict:
+
+def load_dataset() -> EnergyDataset:
     """
-    Balanced spectrum allocator:
-    Considers demand, efficiency, and resource usage equally,
-    with diversity encouragement for better spectrum utilization.
+    Energy dataset (typed, columnar), loaded once per process. New
+    partitions or a changed CSV are picked up on the next call.
     """
+    return get_dataset()
 
-    # Load dataset
-    if not os.path.exists(DATA_PATH):
-        raise FileNotFoundError(f"Dataset not found at {DATA_PATH}")
 
-    df = pd.read_csv(DATA_PATH)
-    df.fillna(0, inplace=True)
+# ---------------------------
+# Normalization helpers
+# ---------------------------
+def min_max_normalize(d):
+    vals = list(d.values())
+    if not vals:
+        return {k: 0.5 for k in d}
+    vmin, vmax = min(vals), max(vals)
+    if vmax == vmin:
+        return {k: 0.5 for k in d}
+    return {k: (v - vmin) / (vmax - vmin) for k, v in d.items()}
 
-    # Input extraction
-    regions: List[str] = request_data.get("regions") or [request_data.get("region")]
-    bands: List[str] = [str(b).lower() for b in request_data.get("bands", [])]
-    demand: Dict = request_data.get("demand", {r: 1.0 for r in regions})
 
-    if not bands:
-        raise ValueError("No bands provided.")
+def compute_region_metrics(data, regions: List[str]) -> Dict:
+    """
+    Per-region averages and efficiency. `data` is an EnergyDataset (looked up
+    through its cluster index) or a plain DataFrame.
+    """
+    if isinstance(data, EnergyDataset):
+        means = data.cluster_means(regions)
+    else:
+        means = {}
+        for region in regions:
+            region_data = data[data["Jio_Cluster"].str.lower() == region.lower()]
+            means[region] = None if region_data.empty else {
+                m: region_data[m].mean() for m in ("Bandwidth_MHz", "Power_Usage_kW", "Energy_Consumption_kWh")
+            }
 
-    # ---------------------------
-    # Region Metrics Calculation
-    # ---------------------------
     region_metrics = {}
     for region in regions:
-        region_data = df[df["Jio_Cluster"].str.lower() == region.lower()]
-        if not region_data.empty:
-            avg_bw = region_data["Bandwidth_MHz"].mean()
-            avg_power = region_data["Power_Usage_kW"].mean()
-            avg_energy = region_data["Energy_Consumption_kWh"].mean()
+        m = means[region]
+        if m is not None:
+            avg_bw = m["Bandwidth_MHz"]
+            avg_power = m["Power_Usage_kW"]
+            avg_energy = m["Energy_Consumption_kWh"]
             efficiency = round((avg_bw / (avg_power + 0.1)), 3)
         else:
             avg_bw, avg_power, avg_energy, efficiency = 0, 0, 0, 0
@@ -56,20 +97,14 @@ async def allocate_spectrum(request_data: Dict) -> Dict:
             "avg_energy": avg_energy,
             "efficiency": efficiency,
         }
+    return region_metrics
 
-    # ---------------------------
-    # Normalization helpers
-    # ---------------------------
-    def min_max_normalize(d):
-        vals = list(d.values())
-        if not vals:
-            return {k: 0.5 for k in d}
-        vmin, vmax = min(vals), max(vals)
-        if vmax == vmin:
-            return {k: 0.5 for k in d}
-        return {k: (v - vmin) / (vmax - vmin) for k, v in d.items()}
-
-    # Normalized maps for balancing
+
+def normalized_inputs(regions: List[str], demand: Dict, region_metrics: Dict) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Per-region demand, efficiency and (inverted) resource scores in [0, 1],
+    as arrays aligned with `regions`.
+    """
     demand_map = {r: float(demand.get(r, 1.0)) for r in regions}
     eff_map = {r: float(region_metrics[r]["efficiency"]) for r in regions}
     resource_raw = {
@@ -80,90 +115,286 @@ async def allocate_spectrum(request_data: Dict) -> Dict:
     demand_norm = min_max_normalize(demand_map)
     eff_norm = min_max_normalize(eff_map)
     resource_norm_raw = min_max_normalize(resource_raw)
-    resource_norm = {r: 1.0 - resource_norm_raw[r] for r in regions}  # invert (less = better)
 
-    # ---------------------------
-    # Genetic Algorithm setup
-    # ---------------------------
-    pop_size = 60
-    gens = 80
+    d = np.array([demand_norm[r] for r in regions], dtype=float)
+    e = np.array([eff_norm[r] for r in regions], dtype=float)
+    res = 1.0 - np.array([resource_norm_raw[r] for r in regions], dtype=float)  # invert (less = better)
+    return d, e, res
 
-    def rand_ind():
-        return [random.randrange(len(bands)) for _ in regions]
 
-    def decode(ind):
-        band_keys = [bands[i] for i in ind]
-        return {r: BAND_LABELS.get(b, b) for r, b in zip(regions, band_keys)}
+# ---------------------------
+# Precomputed fitness table
+# ---------------------------
+@lru_cache(maxsize=SCORE_TABLE_CACHE_SIZE)
+def _score_table_cached(d: tuple, e: tuple, res: tuple, n_bands: int) -> np.ndarray:
+    d_s = np.asarray(d)[:, None]
+    e_s = np.asarray(e)[:, None]
+    res_s = np.asarray(res)[:, None]
 
-    # ---------------------------
-    # Balanced fitness function
-    # ---------------------------
-    def fitness(ind):
-        total_score = 0.0
-        for r, band_idx in zip(regions, ind):
-            d_s = demand_norm.get(r, 0.5)
-            e_s = eff_norm.get(r, 0.5)
-            res_s = resource_norm.get(r, 0.5)
+    # Ideal band index from demand + efficiency
+    ideal_band_float = (d_s + e_s) / 2.0 * (n_bands - 1)
+
+    # Band match score (closer to ideal = higher)
+    if n_bands == 1:
+        band_match = np.ones_like(d_s)
+    else:
+        band_idx = np.arange(n_bands)[None, :]
+        band_match = np.maximum(0.0, 1.0 - np.abs(band_idx - ideal_band_float) / (n_bands - 1))
 
-            # Ideal band index from demand + efficiency
-            combined = (d_s + e_s) / 2.0
-            ideal_band_float = combined * (len(bands) - 1)
+    # Equal weighting of factors, slight demand bias
+    region_score = (1.5 * d_s + e_s + res_s + band_match) / 4.5
+    table = region_score * (1.0 + d_s)
+    table.setflags(write=False)
+    return table
 
-            # Band match score (closer to ideal = higher)
-            if len(bands) == 1:
-                band_match = 1.0
-            else:
-                band_match = max(0.0, 1.0 - (abs(band_idx - ideal_band_float) / (len(bands) - 1)))
 
-            # Equal weighting of factors
-            region_score = (1.5 * d_s + e_s + res_s + band_match) / 4.5
+def score_table(d: np.ndarray, e: np.ndarray, res: np.ndarray, n_bands: int) -> np.ndarray:
+    """
+    (regions x bands) matrix of per-region scores; entry [r, b] is the
+    contribution of region r when assigned band index b. Cached across
+    requests with the same normalized inputs. The result is read-only.
+    """
+    def key(a):
+        return tuple(np.round(a, SCORE_TABLE_PRECISION).tolist())
+    return _score_table_cached(key(d), key(e), key(res), int(n_bands))
+
 
+def population_fitness(population: np.ndarray, table: np.ndarray) -> np.ndarray:
+    """
+    Balanced fitness for a (pop_size x regions) array of band indices:
+    gather-and-sum over the score table, times the diversity bonus.
+    """
+    n_regions = population.shape[1]
+    total_score = table[np.arange(n_regions), population].sum(axis=1)
 
-            # Slight demand bias
-            total_score += region_score * (1.0 + d_s)
+    # Encourage diversity: reward unique bands
+    ordered = np.sort(population, axis=1)
+    unique_bands = 1 + (np.diff(ordered, axis=1) != 0).sum(axis=1)
+    diversity_bonus = 1.0 + 0.15 * (unique_bands / max(1, n_regions))
 
-        # Encourage diversity: reward unique bands
-        unique_bands = len(set(ind))
-        diversity_bonus = 1.0 + 0.15 * (unique_bands / max(1, len(ind)))
+    return total_score * diversity_bonus
 
-        return total_score * diversity_bonus
+
+async def allocate_spectrum(request_data: Dict, log_replay: bool = True) -> Dict:
+    """
+    Balanced spectrum allocator:
+    Considers demand, efficiency, and resource usage equally,
+    with diversity encouragement for better spectrum utilization.
+
+    All randomness comes from one seed (the request's `seed`, else derived
+    from the request hash), so identical requests get identical results.
+    Each run is appended to the replay log unless log_replay is False.
+    """
+    seed = request_seed(request_data)
+    started = time.perf_counter()
+    # CPU-bound (dataset refresh + GA/NSGA-II): keep it off the event loop
+    dataset = await asyncio.to_thread(load_dataset)
+    result = await asyncio.to_thread(_allocate, request_data, dataset, np.random.default_rng(seed))
+    result["seed"] = seed
+    if log_replay:
+        solver = result.get("solver") or {"mode": "ga", "pop_size": GA_POP_SIZE, "generations": GA_GENERATIONS}
+        replay_log.record(request_data, seed, solver, result, dataset.fingerprint(), time.perf_counter() - started)
+    return result
+
+
+def _allocate(request_data: Dict, dataset: EnergyDataset, rng: np.random.Generator) -> Dict:
+    # Input extraction
+    regions: List[str] = request_data.get("regions") or [request_data.get("region")]
+    bands: List[str] = [str(b).lower() for b in request_data.get("bands") or []]
+    demand: Dict = request_data.get("demand") or {r: 1.0 for r in regions}
+
+    if not bands:
+        raise ValueError("No bands provided.")
+
+    # ---------------------------
+    # Region Metrics Calculation
+    # ---------------------------
+    region_metrics = compute_region_metrics(dataset, regions)
+    d, e, res = normalized_inputs(regions, demand, region_metrics)
+    table = score_table(d, e, res, len(bands))
+
+    # Optional fairness objective: fitness *= (1 + w * Jain index)
+    fairness_weight = float(request_data.get("fairness_weight") or 0.0)
+    weights = np.array([float(demand.get(r, 1.0)) for r in regions])
+
+    def evaluate(population):
+        scores = population_fitness(population, table)
+        if fairness_weight > 0:
+            scores = scores * (1.0 + fairness_weight * jain_index(band_shares(population, weights, len(bands))))
+        return scores
+
+    if request_data.get("mode") == "pareto":
+        return _allocate_pareto(request_data, regions, bands, region_metrics, table, weights, rng)
+    if request_data.get("mode") == "spatial":
+        return _allocate_spatial(request_data, regions, bands, region_metrics, table, rng)
+
+    # ---------------------------
+    # Genetic Algorithm setup
+    # ---------------------------
+    pop_size = GA_POP_SIZE
+    gens = GA_GENERATIONS
+    n_regions, n_bands = len(regions), len(bands)
+    n_elites = max(2, pop_size // 10)
+    n_children = pop_size - n_elites
+
+    def decode(ind):
+        band_keys = [bands[i] for i in ind]
+        return {r: BAND_LABELS.get(b, b) for r, b in zip(regions, band_keys)}
 
     # ---------------------------
     # Evolutionary process
     # ---------------------------
-    population = [rand_ind() for _ in range(pop_size)]
+    population = rng.integers(n_bands, size=(pop_size, n_regions))
+    positions = np.arange(n_regions)[None, :]
 
     for _ in range(gens):
-        scored = sorted(
-            [(fitness(ind), ind) for ind in population],
-            key=lambda x: x[0],
-            reverse=True,
-        )
-        elites = [ind for _, ind in scored[: max(2, pop_size // 10)]]
-        newpop = elites.copy()
-
-        while len(newpop) < pop_size:
-            p1, p2 = random.sample(elites, 2)
-            cut = random.randint(1, max(1, len(regions) - 1))
-            child = p1[:cut] + p2[cut:]
-            if random.random() < 0.2:  # mutation chance
-                mpos = random.randrange(len(regions))
-                child[mpos] = random.randrange(len(bands))
-            newpop.append(child)
-
-        population = newpop
+        scores = evaluate(population)
+        elites = population[np.argsort(-scores, kind="stable")[:n_elites]]
+
+        # Two distinct elite parents per child, one-point crossover
+        i1 = rng.integers(n_elites, size=n_children)
+        i2 = (i1 + rng.integers(1, n_elites, size=n_children)) % n_elites
+        cut = rng.integers(1, max(1, n_regions - 1) + 1, size=n_children)
+        children = np.where(positions < cut[:, None], elites[i1], elites[i2])
+
+        mutate = rng.random(n_children) < 0.2  # mutation chance
+        mpos = rng.integers(n_regions, size=n_children)
+        children[mutate, mpos[mutate]] = rng.integers(n_bands, size=int(mutate.sum()))
+
+        population = np.concatenate([elites, children])
 
     # ---------------------------
     # Select best individual
     # ---------------------------
-    best_score, best_ind = max(
-        [(fitness(ind), ind) for ind in population], key=lambda x: x[0]
-    )
+    scores = evaluate(population)
+    best = int(np.argmax(scores))
+    best_score, best_ind = float(scores[best]), population[best].tolist()
 
     allocation_map = decode(best_ind)
 
     return {
         "allocation_map": allocation_map,
+        "band_indices": [int(i) for i in best_ind],
         "score": float(round(best_score, 3)),
         "region_metrics": region_metrics,
     }
+
+
+# ---------------------------
+# Multi-objective (Pareto) mode
+# ---------------------------
+def _allocate_pareto(request_data: Dict, regions: List[str], bands: List[str], region_metrics: Dict,
+                     table: np.ndarray, weights: np.ndarray, rng: np.random.Generator) -> Dict:
+    """
+    NSGA-II over (balanced score, Jain fairness, energy cost). Returns the
+    non-dominated front; the top-scoring front member is used as the
+    headline allocation so the response stays compatible with single mode.
+    """
+    n_regions, n_bands = len(regions), len(bands)
+    energy = energy_cost_table(region_metrics, regions, n_bands)
+    positions = np.arange(n_regions)
+
+    def objectives(population):
+        score = population_fitness(population, table)
+        jain = jain_index(band_shares(population, weights, n_bands))
+        cost = energy[positions, population].sum(axis=1)
+        return np.column_stack([-score, -jain, cost])
+
+    # Explicit None checks: 0 generations is a valid (e.g. replayed) setting
+    budget = request_data.get("time_budget_s")
+    pop_size, gens = request_data.get("pop_size"), request_data.get("generations")
+    result = nsga2(
+        objectives,
+        n_regions,
+        n_bands,
+        pop_size=min(int(pop_size), MAX_POP_SIZE) if pop_size is not None else PARETO_POP_SIZE,
+        max_gens=min(int(gens), MAX_GENERATIONS) if gens is not None else PARETO_MAX_GENS,
+        time_budget_s=float(budget) if budget is not None else PARETO_TIME_BUDGET_S,
+        rng=rng,
+    )
+
+    front = []
+    for ind, obj in zip(result["population"], result["objectives"]):
+        front.append({
+            "allocation_map": {r: BAND_LABELS.get(bands[i], bands[i]) for r, i in zip(regions, ind)},
+            "band_indices": [int(i) for i in ind],
+            "objectives": {
+                "score": float(round(-obj[0], 3)),
+                "jain": float(round(-obj[1], 4)),
+                "energy_cost": float(round(obj[2], 3)),
+            },
+        })
+    front.sort(key=lambda s: s["objectives"]["score"], reverse=True)
+    best = front[0]
+
+    return {
+        "allocation_map": best["allocation_map"],
+        "band_indices": best["band_indices"],
+        "score": best["objectives"]["score"],
+        "region_metrics": region_metrics,
+        "pareto_front": front,
+        "solver": {
+            "mode": "pareto",
+            "generations": result["generations"],
+            "elapsed_s": round(result["elapsed_s"], 3),
+        },
+    }
+
+
+# ---------------------------
+# Spatial (adjacency-aware) mode
+# ---------------------------
+def build_adjacency(request_data: Dict, regions: List[str]):
+    """
+    Region graph from the request's `edges`, else its `coordinates`
+    ({region: [lat, lon]}), else the dataset's Latitude/Longitude columns.
+    """
+    if request_data.get("edges"):
+        return adjacency_from_edge_list(regions, request_data["edges"])
+    coords = request_data.get("coordinates") or {}
+    coords = {str(k).lower(): v for k, v in coords.items()}
+    known = cluster_coordinates([r for r in regions if r.lower() not in coords]) if len(coords) < len(regions) else {}
+    points = []
+    for r in regions:
+        point = coords.get(r.lower(), known.get(r))
+        if point is None:
+            raise ValueError(f"Spatial mode needs `edges` or coordinates for every region (missing: {r})")
+        points.append([float(point[0]), float(point[1])])
+    return adjacency_from_coordinates(np.array(points), k=int(request_data.get("neighbours") or SPATIAL_NEIGHBOURS))
+
+
+def _allocate_spatial(request_data: Dict, regions: List[str], bands: List[str], region_metrics: Dict,
+                      table: np.ndarray, rng: np.random.Generator) -> Dict:
+    """
+    Per-region scores minus a penalty for neighbours sharing a band; scales
+    to thousands of regions by partitioning the adjacency graph.
+    """
+    adj = build_adjacency(request_data, regions)
+    penalty = request_data.get("conflict_penalty")
+    pop_size, gens = request_data.get("pop_size"), request_data.get("generations")
+    result = spatial_allocate(
+        table,
+        adj,
+        penalty=float(penalty) if penalty is not None else SPATIAL_CONFLICT_PENALTY,
+        # Same bounds as the API enforces, for callers that bypass it (CLI, replay)
+        **({"pop_size": min(max(2, int(pop_size)), MAX_POP_SIZE)} if pop_size is not None else {}),
+        **({"gens": min(max(0, int(gens)), MAX_GENERATIONS)} if gens is not None else {}),
+        rng=rng,
+    )
+    band_indices = [int(i) for i in result["assignment"]]
+
+    return {
+        "allocation_map": {r: BAND_LABELS.get(bands[i], bands[i]) for r, i in zip(regions, band_indices)},
+        "band_indices": band_indices,
+        "score": float(round(result["score"], 3)),
+        "region_metrics": region_metrics,
+        "solver": {
+            "mode": "spatial",
+            "edges": adj.n_edges,
+            "conflicts": result["conflicts"],
+            "partitions": result["partitions"],
+            "boundary_nodes": result["boundary_nodes"],
+            "reconcile_moves": result["reconcile_moves"],
+            "elapsed_s": round(result["elapsed_s"], 3),
+        },
+    }
@@ -0,0 +1,299 @@
+# agents/spatial_allocator.py
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+# Defaults for the spatial mode (overridable per request)
+SPATIAL_NEIGHBOURS = 6                # k nearest clusters linked when building from coordinates
+SPATIAL_CONFLICT_PENALTY = 0.5        # fitness lost per unit of co-band neighbour weight
+SPATIAL_PARTITION_SIZE = int(os.getenv("SPATIAL_PARTITION_SIZE", "64"))
+SPATIAL_WORKERS = int(os.getenv("SPATIAL_WORKERS", str(min(8, os.cpu_count() or 1))))
+SPATIAL_POP_SIZE = 40
+SPATIAL_GENS = 60
+EARTH_RADIUS_KM = 6371.0
+
+
+# ---------------------------
+# Sparse adjacency (CSR)
+# ---------------------------
+class Adjacency:
+    """
+    Symmetric weighted region graph in CSR form: the neighbours of node v
+    are indices[indptr[v]:indptr[v + 1]] with matching weights.
+    """
+
+    __slots__ = ("n", "indptr", "indices", "weights")
+
+    def __init__(self, n: int, indptr: np.ndarray, indices: np.ndarray, weights: np.ndarray):
+        self.n = n
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+
+    @classmethod
+    def from_edges(cls, n: int, src, dst, weights=None) -> "Adjacency":
+        """Symmetrize, drop self-loops and merge duplicate edges (keeping the largest weight)."""
+        src = np.asarray(src, dtype=np.int64)
+        dst = np.asarray(dst, dtype=np.int64)
+        w = np.ones(src.size) if weights is None else np.asarray(weights, dtype=float)
+        u = np.concatenate([src, dst])
+        v = np.concatenate([dst, src])
+        w = np.concatenate([w, w])
+        keep = u != v
+        u, v, w = u[keep], v[keep], w[keep]
+
+        order = np.lexsort((v, u))
+        u, v, w = u[order], v[order], w[order]
+        first = np.ones(u.size, dtype=bool)
+        first[1:] = (u[1:] != u[:-1]) | (v[1:] != v[:-1])
+        starts = np.flatnonzero(first)
+        w = np.maximum.reduceat(w, starts) if starts.size else w
+        u, v = u[starts], v[starts]
+
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(u, minlength=n), out=indptr[1:])
+        return cls(n, indptr, v, w)
+
+    @property
+    def n_edges(self) -> int:
+        return int(self.indices.size // 2)
+
+    def row(self, v: int):
+        lo, hi = self.indptr[v], self.indptr[v + 1]
+        return self.indices[lo:hi], self.weights[lo:hi]
+
+    def edges(self):
+        """Each undirected edge once, as (u, v, weight) arrays with u < v."""
+        u = np.repeat(np.arange(self.n), np.diff(self.indptr))
+        upper = u < self.indices
+        return u[upper], self.indices[upper], self.weights[upper]
+
+
+def adjacency_from_edge_list(regions: Sequence[str], edges: List) -> Adjacency:
+    """Edges as [region_a, region_b] or [region_a, region_b, weight] (names matched case-insensitively)."""
+    pos = {str(r).lower(): i for i, r in enumerate(regions)}
+    src, dst, w = [], [], []
+    for edge in edges:
+        a, b = str(edge[0]).lower(), str(edge[1]).lower()
+        if a not in pos or b not in pos:
+            raise ValueError(f"Edge {edge!r} references a region that is not in the request")
+        src.append(pos[a])
+        dst.append(pos[b])
+        w.append(float(edge[2]) if len(edge) > 2 else 1.0)
+    return Adjacency.from_edges(len(regions), src, dst, w)
+
+
+def adjacency_from_coordinates(coords: np.ndarray, k: int = SPATIAL_NEIGHBOURS,
+                               radius_km: Optional[float] = None, chunk: int = 1024) -> Adjacency:
+    """
+    k-nearest-neighbour graph over (lat, lon) degrees, great-circle distance.
+    Edge weight exp(-d / median neighbour distance): closer clusters
+    interfere more. Neighbours farther than radius_km are dropped.
+    """
+    coords = np.asarray(coords, dtype=float)
+    n = coords.shape[0]
+    k = min(k, n - 1)
+    if k <= 0:
+        return Adjacency.from_edges(n, [], [])
+    lat, lon = np.radians(coords[:, 0]), np.radians(coords[:, 1])
+    xyz = np.column_stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)])
+
+    # Brute-force kNN on unit vectors in row chunks: memory stays chunk x n
+    src, dst, dist = [], [], []
+    for start in range(0, n, chunk):
+        sim = xyz[start:start + chunk] @ xyz.T
+        rows = np.arange(sim.shape[0])
+        sim[rows, start + rows] = -np.inf
+        nearest = np.argpartition(-sim, k - 1, axis=1)[:, :k]
+        chord = np.sqrt(np.clip(2.0 - 2.0 * np.take_along_axis(sim, nearest, axis=1), 0.0, 4.0))
+        src.append(np.repeat(start + rows, k))
+        dst.append(nearest.ravel())
+        dist.append(2.0 * EARTH_RADIUS_KM * np.arcsin(np.minimum(1.0, chord / 2.0)).ravel())
+    src, dst, dist = np.concatenate(src), np.concatenate(dst), np.concatenate(dist)
+
+    if radius_km is not None:
+        near = dist <= radius_km
+        src, dst, dist = src[near], dst[near], dist[near]
+    scale = float(np.median(dist)) if dist.size else 0.0
+    weights = np.exp(-dist / scale) if scale > 0 else np.ones(dist.size)
+    return Adjacency.from_edges(n, src, dst, weights)
+
+
+# ---------------------------
+# Objective
+# ---------------------------
+def conflict_weight(assignment: np.ndarray, u: np.ndarray, v: np.ndarray, w: np.ndarray) -> np.ndarray:
+    """Total weight of co-band edges, per row of a (pop x n) array (or a scalar for one assignment)."""
+    return (assignment[..., u] == assignment[..., v]) @ w
+
+
+def spatial_score(assignment: np.ndarray, table: np.ndarray, adj: Adjacency, penalty: float) -> float:
+    u, v, w = adj.edges()
+    unary = table[np.arange(adj.n), assignment].sum()
+    return float(unary - penalty * conflict_weight(assignment, u, v, w))
+
+
+# ---------------------------
+# Partitioning
+# ---------------------------
+def partition_graph(adj: Adjacency, max_size: int) -> List[np.ndarray]:
+    """
+    Greedy BFS region growing: each partition is a connected patch of at
+    most max_size nodes, listed in BFS order (so one-point crossover cuts
+    the patch into spatially coherent halves).
+    """
+    part = np.full(adj.n, -1, dtype=np.int64)
+    parts = []
+    for seed in np.argsort(np.diff(adj.indptr), kind="stable"):
+        if part[seed] >= 0:
+            continue
+        members, queue = [], deque([int(seed)])
+        part[seed] = len(parts)
+        while queue and len(members) < max_size:
+            node = queue.popleft()
+            members.append(node)
+            for nb in adj.row(node)[0]:
+                if part[nb] < 0 and len(members) + len(queue) < max_size:
+                    part[nb] = len(parts)
+                    queue.append(int(nb))
+        parts.append(np.asarray(members, dtype=np.int64))
+    return parts
+
+
+# ---------------------------
+# Local optimization
+# ---------------------------
+def _local_search(assignment: np.ndarray, unary: np.ndarray, adj: Adjacency, penalty: float,
+                  nodes: Optional[np.ndarray] = None, max_updates: Optional[int] = None) -> int:
+    """
+    Best-response moves (iterated conditional modes) in place, starting from
+    `nodes` and following any node whose neighbourhood changed. Every move
+    strictly improves the objective, so this terminates. Returns moves made.
+    """
+    n_bands = unary.shape[1]
+    pending = deque(int(v) for v in (range(adj.n) if nodes is None else nodes))
+    queued = np.zeros(adj.n, dtype=bool)
+    queued[list(pending)] = True
+    max_updates = max_updates or 20 * adj.n
+    moves = 0
+    while pending and moves < max_updates:
+        v = pending.popleft()
+        queued[v] = False
+        nbrs, w = adj.row(v)
+        gain = unary[v] - penalty * np.bincount(assignment[nbrs], weights=w, minlength=n_bands)
+        best = int(np.argmax(gain))
+        if gain[best] > gain[assignment[v]] + 1e-12:
+            assignment[v] = best
+            moves += 1
+            for nb in nbrs[~queued[nbrs]]:
+                queued[nb] = True
+                pending.append(int(nb))
+    return moves
+
+
+def solve_partition(nodes: np.ndarray, table: np.ndarray, adj: Adjacency, assignment: np.ndarray,
+                    penalty: float, pop_size: int = SPATIAL_POP_SIZE, gens: int = SPATIAL_GENS,
+                    seed: Optional[int] = None) -> np.ndarray:
+    """
+    GA over one partition with bands outside it held fixed at `assignment`;
+    co-band edges to those fixed neighbours are folded into the per-node
+    table. Seeded with the current bands and polished by local search, so
+    the result never scores below them. Returns bands for `nodes`.
+    """
+    rng = np.random.default_rng(seed)
+    m, n_bands = nodes.size, table.shape[1]
+    local = np.full(adj.n, -1, dtype=np.int64)
+    local[nodes] = np.arange(m)
+
+    # Internal edges (local ids) and the cost of matching each fixed outside neighbour
+    src, dst, wts = [], [], []
+    outside_cost = np.zeros((m, n_bands))
+    for i, v in enumerate(nodes):
+        nbrs, w = adj.row(v)
+        inside = local[nbrs] >= 0
+        src.append(np.full(int(inside.sum()), i))
+        dst.append(local[nbrs[inside]])
+        wts.append(w[inside])
+        outside_cost[i] = np.bincount(assignment[nbrs[~inside]], weights=w[~inside], minlength=n_bands)
+    sub = Adjacency.from_edges(m, np.concatenate(src), np.concatenate(dst), np.concatenate(wts))
+    unary = table[nodes] - penalty * outside_cost
+    u, v, w = sub.edges()
+    positions = np.arange(m)[None, :]
+
+    def evaluate(population):
+        return unary[np.arange(m), population].sum(axis=1) - penalty * conflict_weight(population, u, v, w)
+
+    population = rng.integers(n_bands, size=(pop_size, m))
+    population[0] = assignment[nodes]
+    n_elites = max(2, pop_size // 10)
+    n_children = pop_size - n_elites
+    if m > 1:
+        for _ in range(gens):
+            elites = population[np.argsort(-evaluate(population), kind="stable")[:n_elites]]
+            i1 = rng.integers(n_elites, size=n_children)
+            i2 = (i1 + rng.integers(1, n_elites, size=n_children)) % n_elites
+            cut = rng.integers(1, m, size=n_children)
+            children = np.where(positions < cut[:, None], elites[i1], elites[i2])
+            mutate = rng.random(children.shape) < 1.0 / m
+            children[mutate] = rng.integers(n_bands, size=int(mutate.sum()))
+            population = np.concatenate([elites, children])
+
+    best = population[int(np.argmax(evaluate(population)))].copy()
+    _local_search(best, unary, sub, penalty)
+    return best
+
+
+def spatial_allocate(table: np.ndarray, adj: Adjacency, penalty: float = SPATIAL_CONFLICT_PENALTY,
+                     partition_size: int = SPATIAL_PARTITION_SIZE, workers: int = SPATIAL_WORKERS,
+                     pop_size: int = SPATIAL_POP_SIZE, gens: int = SPATIAL_GENS,
+                     rng: Optional[np.random.Generator] = None) -> Dict:
+    """
+    Maximize sum(table[r, band_r]) - penalty * (weight of co-band edges).
+
+    Starts from each region's best band, splits the graph into connected
+    partitions, optimizes them in parallel against the starting bands of
+    their outside neighbours, then reconciles the boundaries with local
+    search over the nodes whose neighbours changed.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    started = time.perf_counter()
+    assignment = np.argmax(table, axis=1).astype(np.int64)
+    parts = partition_graph(adj, max(1, partition_size))
+    seeds = rng.integers(2 ** 63, size=len(parts))
+    snapshot = assignment.copy()
+
+    def solve(i):
+        return solve_partition(parts[i], table, adj, snapshot, penalty, pop_size, gens, int(seeds[i]))
+
+    if workers > 1 and len(parts) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            solved = list(pool.map(solve, range(len(parts))))
+    else:
+        solved = [solve(i) for i in range(len(parts))]
+    for nodes, bands in zip(parts, solved):
+        assignment[nodes] = bands
+
+    # Partitions saw their outside neighbours' starting bands; fix up the seams
+    owner = np.empty(adj.n, dtype=np.int64)
+    for i, nodes in enumerate(parts):
+        owner[nodes] = i
+    row_of = np.repeat(np.arange(adj.n), np.diff(adj.indptr))
+    boundary = np.unique(row_of[owner[row_of] != owner[adj.indices]])
+    moves = _local_search(assignment, table, adj, penalty, nodes=boundary)
+
+    u, v, w = adj.edges()
+    same = assignment[u] == assignment[v]
+    return {
+        "assignment": assignment,
+        "score": spatial_score(assignment, table, adj, penalty),
+        "conflicts": int(same.sum()),
+        "conflict_weight": float(w[same].sum()),
+        "partitions": len(parts),
+        "boundary_nodes": int(boundary.size),
+        "reconcile_moves": moves,
+        "elapsed_s": time.perf_counter() - started,
+    }
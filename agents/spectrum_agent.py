@@ -9,14 +9,18 @@ async def monitor_channels(allocation_res: dict) -> dict:
         - <= 0.6  → stable
         - 0.6–0.75 → warning
         - > 0.75  → realloc_suggested
+
+    The simulation is seeded with the allocation's seed, so a replayed
+    request reproduces its monitoring metrics too.
     """
     allocation_map = allocation_res.get("allocation_map", {})
+    rng = random.Random(allocation_res.get("seed"))
     metrics = {}
 
     for region, band in allocation_map.items():
         # Simulate random traffic and interference
-        traffic_load = round(random.uniform(0.2, 1.0), 2)
-        interference_index = round(random.uniform(0.0, 0.9), 2)
+        traffic_load = round(rng.uniform(0.2, 1.0), 2)
+        interference_index = round(rng.uniform(0.0, 0.9), 2)
 
         # Determine status based on interference thresholds
         if interference_index > 0.75:
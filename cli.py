@@ -0,0 +1,507 @@
+# cli.py
+"""
+Batch runner for offline jobs, without going through the HTTP API.
+
+    python cli.py allocate requests.jsonl -o results.jsonl --workers 4 --no-summary --no-policy
+    python cli.py eval queries.jsonl -o eval.parquet --top-k 5
+    python cli.py index [--rebuild | --from-flat | --shard NAME]
+
+Input files hold one JSON object per line: an /allocate request body for
+`allocate`, and {"query": ..., "relevant": [source URLs or chunk ids]}
+(plus optional "filters") for `eval`. Results are streamed as they
+complete, to .jsonl or .parquet depending on the output suffix.
+
+`allocate` keeps its history and replay records under data/cli/ (see
+--state-dir), apart from the server's; re-run one with
+`python -m agents.replay --dir data/cli/replay run <request_id>`.
+"""
+import os
+import gc
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import multiprocessing as mp
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+PROGRESS_EVERY_S = 2.0
+PARQUET_BATCH_ROWS = 500
+# Allocation history and replay records of CLI runs go here, not into the
+# server's data/history and data/replay
+CLI_STATE_DIR = os.getenv("CLI_STATE_DIR", os.path.join("data", "cli"))
+
+
+# -----------------------------
+# Input / output
+# -----------------------------
+def read_jsonl(path: str, on_error: Callable[[int, str], None] = None) -> Iterator[Tuple[int, Dict]]:
+    """
+    (line number, object) per non-empty line. Lines that are not a JSON
+    object are passed to on_error(line_no, message) and skipped, so one bad
+    line doesn't abort the job.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                obj = json.loads(line)
+                if not isinstance(obj, dict):
+                    raise ValueError(f"expected a JSON object, got {type(obj).__name__}")
+            except ValueError as e:
+                if on_error is None:
+                    raise
+                on_error(line_no, f"{type(e).__name__}: {e}")
+                continue
+            yield line_no, obj
+
+
+def count_lines(path: str) -> int:
+    with open(path, "rb") as f:
+        return sum(1 for line in f if line.strip())
+
+
+class JsonlSink:
+    def __init__(self, path: str):
+        self._f = sys.stdout if path == "-" else open(path, "w", encoding="utf-8")
+
+    def write(self, row: Dict):
+        self._f.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+
+    def close(self):
+        self._f.flush()
+        if self._f is not sys.stdout:
+            self._f.close()
+
+
+class ParquetSink:
+    """
+    Rows are buffered into row groups. Nested values are stored as JSON
+    strings so the schema stays flat. The schema is the union of every
+    row's keys: a batch with new columns (or a value that doesn't fit a
+    column's type) rewrites what was written so far under the wider schema.
+    """
+
+    def __init__(self, path: str, batch_rows: int = PARQUET_BATCH_ROWS):
+        import pyarrow  # noqa: F401  (fail early when missing)
+        self.path = path
+        self.batch_rows = batch_rows
+        self._rows: List[Dict] = []
+        self._writer = None
+        self._schema = None
+        self._file = path
+        self._rewrites = 0
+
+    @staticmethod
+    def _flat(row: Dict) -> Dict:
+        return {
+            k: json.dumps(v, ensure_ascii=False, default=str) if isinstance(v, (dict, list, tuple)) else v
+            for k, v in row.items()
+        }
+
+    @staticmethod
+    def _arrow_type(values):
+        import pyarrow as pa
+
+        if not values:
+            return pa.null()  # only None so far; typed once a value shows up
+        if all(isinstance(v, bool) for v in values):
+            return pa.bool_()
+        if all(isinstance(v, int) and not isinstance(v, bool) for v in values):
+            return pa.int64()
+        if all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+            return pa.float64()
+        return pa.string()
+
+    def _infer_schema(self, rows: List[Dict]):
+        import pyarrow as pa
+
+        names = list(dict.fromkeys(k for row in rows for k in row))
+        return pa.schema([(k, self._arrow_type([r[k] for r in rows if r.get(k) is not None])) for k in names])
+
+    @staticmethod
+    def _widen(old, new):
+        import pyarrow as pa
+
+        if old == new or pa.types.is_null(new):
+            return old
+        if pa.types.is_null(old):
+            return new
+        if {old, new} == {pa.int64(), pa.float64()}:
+            return pa.float64()
+        return pa.string()
+
+    def _merge_schema(self, batch):
+        import pyarrow as pa
+
+        fields = [pa.field(f.name, self._widen(f.type, batch.field(f.name).type) if f.name in batch.names else f.type)
+                  for f in self._schema]
+        fields += [f for f in batch if f.name not in self._schema.names]
+        return pa.schema(fields)
+
+    def _rewrite(self, schema):
+        """Copy the rows written so far into a new file under `schema`."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        self._writer.close()
+        old_file, written = self._file, pq.read_table(self._file)
+        columns = [
+            written.column(f.name).cast(f.type) if f.name in written.column_names else pa.nulls(len(written), f.type)
+            for f in schema
+        ]
+        self._rewrites += 1
+        self._file = f"{self.path}.{self._rewrites}.tmp"
+        self._writer = pq.ParquetWriter(self._file, schema)
+        self._writer.write_table(pa.Table.from_arrays(columns, schema=schema))
+        self._schema = schema
+        os.remove(old_file)
+
+    def _flush(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not self._rows:
+            return
+        batch = self._infer_schema(self._rows)
+        if self._schema is None:
+            self._schema = batch
+            self._writer = pq.ParquetWriter(self._file, self._schema)
+        else:
+            merged = self._merge_schema(batch)
+            if not merged.equals(self._schema):
+                self._rewrite(merged)
+        rows = [{k: r.get(k) for k in self._schema.names} for r in self._rows]
+        for row in rows:
+            for field in self._schema:
+                v = row[field.name]
+                if v is None:
+                    continue
+                if pa.types.is_string(field.type) and not isinstance(v, str):
+                    row[field.name] = str(v)
+                elif pa.types.is_floating(field.type):
+                    row[field.name] = float(v)
+        self._writer.write_table(pa.Table.from_pylist(rows, schema=self._schema))
+        self._rows = []
+
+    def write(self, row: Dict):
+        self._rows.append(self._flat(row))
+        if len(self._rows) >= self.batch_rows:
+            self._flush()
+
+    def close(self):
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+            if self._file != self.path:
+                os.replace(self._file, self.path)
+
+
+def open_sink(path: str):
+    return ParquetSink(path) if path.endswith(".parquet") else JsonlSink(path)
+
+
+def input_error_writer(sink, progress: "Progress") -> Callable[[int, str], None]:
+    """read_jsonl on_error callback: an error row per unparseable input line."""
+    def write(line_no: int, error: str):
+        row = {"line": line_no, "status": "error", "error": error}
+        sink.write(row)
+        progress.update(row)
+    return write
+
+
+class Progress:
+    """Periodic progress/throughput lines on stderr, and a final summary."""
+
+    def __init__(self, total: Optional[int], label: str):
+        self.total = total
+        self.label = label
+        self.done = 0
+        self.errors = 0
+        self.latencies: List[float] = []
+        self.started = time.perf_counter()
+        self._last = self.started
+
+    def update(self, row: Dict):
+        self.done += 1
+        self.errors += row.get("status") == "error"
+        if row.get("elapsed_s") is not None:
+            self.latencies.append(row["elapsed_s"])
+        now = time.perf_counter()
+        if now - self._last >= PROGRESS_EVERY_S:
+            self._last = now
+            elapsed = now - self.started
+            of = f"/{self.total}" if self.total else ""
+            print(f"[{self.label}] {self.done}{of} done, {self.errors} errors, "
+                  f"{self.done / elapsed:.1f}/s, {elapsed:.0f}s elapsed", file=sys.stderr, flush=True)
+
+    def summary(self) -> Dict:
+        elapsed = time.perf_counter() - self.started
+        lat = sorted(self.latencies)
+
+        def pct(p):
+            return round(lat[min(len(lat) - 1, int(p * len(lat)))], 4) if lat else None
+
+        return {
+            "job": self.label,
+            "completed": self.done,
+            "errors": self.errors,
+            "elapsed_s": round(elapsed, 3),
+            "throughput_per_s": round(self.done / elapsed, 2) if elapsed > 0 else None,
+            "latency_p50_s": pct(0.50),
+            "latency_p95_s": pct(0.95),
+        }
+
+
+# -----------------------------
+# Process pool
+# -----------------------------
+def run_pool(fn: Callable, items: Iterable, workers: int, initializer: Callable = None,
+             initargs: tuple = ()) -> Iterator[Dict]:
+    """
+    Yield fn(item) results as they complete. At most a few items per worker
+    are in flight, so huge input files are never loaded whole. workers <= 1
+    runs inline in this process.
+    """
+    if workers <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        for item in items:
+            yield fn(item)
+        return
+
+    # Fork so workers inherit whatever the parent preloaded (copy-on-write)
+    ctx = mp.get_context("fork") if "fork" in mp.get_all_start_methods() else None
+    gc.freeze()
+    window = workers * 4
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx, initializer=initializer,
+                             initargs=initargs) as pool:
+        pending = set()
+        for item in items:
+            pending.add(pool.submit(fn, item))
+            if len(pending) >= window:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    yield fut.result()
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                yield fut.result()
+
+
+def _limit_threads(workers: int):
+    try:
+        import torch
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // max(1, workers)))
+    except ImportError:
+        pass
+
+
+# -----------------------------
+# allocate
+# -----------------------------
+_agent = None
+_agent_options: Dict = {}
+replay_log = None
+
+
+def _init_allocate_worker(options: Dict, workers: int, state_dir: str):
+    global _agent, _agent_options, replay_log
+    from agents import smart_allocator
+    from agents.history import AllocationHistory, SegmentWriter
+    from agents.master_agent import MasterAgent
+    from agents.policy_guardian import check_policy_local
+    from agents.replay import ReplayLog
+
+    _limit_threads(workers)
+    replay_log = smart_allocator.replay_log = ReplayLog(os.path.join(state_dir, "replay"))
+    history = AllocationHistory(writer=SegmentWriter(os.path.join(state_dir, "history")))
+    # Compliance check runs in-process: no server is needed
+    _agent = MasterAgent(history=history, policy_checker=check_policy_local)
+    _agent_options = options
+
+
+def _allocate_one(item: Tuple[int, Dict]) -> Dict:
+    line_no, request = item
+    started = time.perf_counter()
+    row = {"line": line_no, "request_id": request.get("request_id")}
+    try:
+        response = asyncio.run(_agent.run_allocation(request, **_agent_options))
+        row.update(status=response.get("status", "ok"), result=response.get("result"), error=None)
+    except Exception as e:
+        row.update(status="error", result=None, error=f"{type(e).__name__}: {e}")
+    finally:
+        # Pool workers exit without running atexit hooks; don't lose queued records
+        _agent.history.writer.flush()
+        replay_log.writer.flush()
+    row["elapsed_s"] = round(time.perf_counter() - started, 4)
+    return row
+
+
+def cmd_allocate(args) -> Dict:
+    options = {"summarize": not args.no_summary, "check_compliance": not args.no_policy}
+    if options["summarize"] or options["check_compliance"]:
+        # Load the model and index once here; forked workers share them
+        from rag_backend.rag_engine import warm_up
+        warm_up(build_missing=False)
+    from agents.smart_allocator import load_dataset
+    load_dataset()
+
+    progress = Progress(count_lines(args.input), "allocate")
+    sink = open_sink(args.output)
+    try:
+        items = read_jsonl(args.input, on_error=input_error_writer(sink, progress))
+        for row in run_pool(_allocate_one, items, args.workers, _init_allocate_worker,
+                            (options, args.workers, args.state_dir)):
+            if args.compact and row.get("result"):
+                allocation = row["result"].get("allocation", {})
+                row["result"] = {
+                    "allocation_map": allocation.get("allocation_map"),
+                    "band_indices": allocation.get("band_indices"),
+                    "score": allocation.get("score"),
+                    "seed": allocation.get("seed"),
+                    "jain": (row["result"].get("fairness") or {}).get("jain"),
+                }
+            sink.write(row)
+            progress.update(row)
+    finally:
+        sink.close()
+    return progress.summary()
+
+
+# -----------------------------
+# eval
+# -----------------------------
+_eval_options: Dict = {}
+
+
+def _init_eval_worker(options: Dict, workers: int):
+    global _eval_options
+    _limit_threads(workers)
+    _eval_options = options
+
+
+def _eval_one(item: Tuple[int, Dict]) -> Dict:
+    from rag_backend.rag_engine import retrieve
+
+    line_no, case = item
+    k = int(case.get("top_k") or _eval_options["top_k"])
+    relevant = set(case.get("relevant") or [])
+    started = time.perf_counter()
+    row = {"line": line_no, "query": case.get("query")}
+    try:
+        hits = retrieve(case["query"], top_k=k, hybrid=_eval_options["hybrid"], filters=case.get("filters"))
+        matched = [bool(relevant & {h.get("source"), h.get("id")}) for h in hits]
+        first = next((i for i, m in enumerate(matched) if m), None)
+        found = {key for h in hits for key in (h.get("source"), h.get("id")) if key in relevant}
+        row.update(
+            status="ok",
+            hit=first is not None,
+            reciprocal_rank=0.0 if first is None else 1.0 / (first + 1),
+            recall=len(found) / len(relevant) if relevant else None,
+            retrieved=[h.get("source") for h in hits],
+            error=None,
+        )
+    except Exception as e:
+        row.update(status="error", error=f"{type(e).__name__}: {e}")
+    row["elapsed_s"] = round(time.perf_counter() - started, 4)
+    return row
+
+
+def cmd_eval(args) -> Dict:
+    from rag_backend.rag_engine import warm_up
+    warm_up(build_missing=False)
+
+    progress = Progress(count_lines(args.input), "eval")
+    sink = open_sink(args.output)
+    options = {"top_k": args.top_k, "hybrid": not args.no_hybrid}
+    hits, rr, recalls = 0, 0.0, []
+    try:
+        items = read_jsonl(args.input, on_error=input_error_writer(sink, progress))
+        for row in run_pool(_eval_one, items, args.workers, _init_eval_worker, (options, args.workers)):
+            sink.write(row)
+            progress.update(row)
+            if row["status"] == "ok":
+                hits += row["hit"]
+                rr += row["reciprocal_rank"]
+                if row["recall"] is not None:
+                    recalls.append(row["recall"])
+    finally:
+        sink.close()
+    summary = progress.summary()
+    scored = max(1, summary["completed"] - summary["errors"])
+    summary.update({
+        f"hit_rate@{args.top_k}": round(hits / scored, 4),
+        "mrr": round(rr / scored, 4),
+        f"recall@{args.top_k}": round(sum(recalls) / len(recalls), 4) if recalls else None,
+    })
+    return summary
+
+
+# -----------------------------
+# index
+# -----------------------------
+def cmd_index(args) -> Dict:
+    from rag_backend import rag_engine
+
+    started = time.perf_counter()
+    if args.shard:
+        for name in args.shard:
+            rag_engine.rebuild_shard(name)
+        action = f"rebuilt shards {', '.join(args.shard)}"
+    elif args.from_flat:
+        rag_engine.build_shards_from_flat()
+        action = "re-split shards from the flat index"
+    elif args.rebuild:
+        docs = rag_engine.ingest_all(rag_engine.SOURCE_URLS)
+        if not docs:
+            raise RuntimeError("No text extracted from any documents.")
+        rag_engine.build_faiss_index(docs)
+        action = f"rebuilt index from {len(rag_engine.SOURCE_URLS)} sources ({len(docs)} chunks)"
+    else:
+        rag_engine.ensure_index()
+        action = "ensured index"
+    return {"job": "index", "action": action, "elapsed_s": round(time.perf_counter() - started, 3)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--log-level", default="warning")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    alloc = sub.add_parser("allocate", help="run MasterAgent workflows from a JSONL file")
+    alloc.add_argument("--no-summary", action="store_true", help="skip retrieval and the semantic summarizer")
+    alloc.add_argument("--no-policy", action="store_true", help="skip the policy compliance check (retrieval + LLM)")
+    alloc.add_argument("--compact", action="store_true", help="write only allocation, score, seed and Jain index")
+    alloc.add_argument("--state-dir", default=CLI_STATE_DIR,
+                       help="where allocation history and replay records go (kept apart from the server's)")
+
+    ev = sub.add_parser("eval", help="retrieval evaluation from a JSONL file of queries")
+    ev.add_argument("--top-k", type=int, default=5)
+    ev.add_argument("--no-hybrid", action="store_true", help="vector search only (no BM25 fusion)")
+
+    for p in (alloc, ev):
+        p.add_argument("input")
+        p.add_argument("-o", "--output", default="-", help=".jsonl or .parquet path ('-' for stdout)")
+        p.add_argument("--workers", type=int, default=1, help="worker processes (1 = run inline)")
+
+    idx = sub.add_parser("index", help="build or rebuild the retrieval index")
+    group = idx.add_mutually_exclusive_group()
+    group.add_argument("--rebuild", action="store_true", help="re-download sources and rebuild everything")
+    group.add_argument("--from-flat", action="store_true", help="re-split shards from the flat index")
+    group.add_argument("--shard", action="append", help="rebuild one shard (repeatable)")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=args.log_level.upper())
+
+    summary = {"allocate": cmd_allocate, "eval": cmd_eval, "index": cmd_index}[args.command](args)
+    print(json.dumps(summary), file=sys.stderr)
+    return summary
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,18 @@
 # main.py
+import os
+import asyncio
 import logging
-from fastapi import FastAPI, HTTPException
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel, Field
 from agents.master_agent import MasterAgent
+from agents.pareto_allocator import PARETO_TIME_BUDGET_S
+from agents.smart_allocator import MAX_GENERATIONS, MAX_POP_SIZE, load_dataset
+from rag_backend.api import router as rag_router
+from rag_backend.rag_engine import warm_up
+from utils.admission import AdmissionController, Overloaded, RateLimiter, SingleFlight, canonical_key
 
 # ==========================
 # 🔹 Logging Configuration
@@ -11,10 +20,57 @@ from agents.master_agent import MasterAgent
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger("6g-orchestrator")
 
+# ==========================
+# 🔹 Background Warm-up
+# ==========================
+# Requests that arrive before warm-up finishes wait (up to this long) for it,
+# rather than each triggering its own model/index/dataset load.
+WARMUP_WAIT_S = float(os.getenv("WARMUP_WAIT_S", "120"))
+
+warmup_state = {"rag": "pending", "dataset": "pending"}
+warmup_done = asyncio.Event()
+
+
+def _warm_component(name: str, fn):
+    try:
+        fn()
+        warmup_state[name] = "ready"
+    except Exception as e:
+        log.warning("Warm-up of %s failed: %s", name, e)
+        warmup_state[name] = f"failed: {e}"
+
+
+async def _warm_up():
+    try:
+        await asyncio.gather(
+            asyncio.to_thread(_warm_component, "rag", warm_up),
+            asyncio.to_thread(_warm_component, "dataset", load_dataset),
+        )
+    finally:
+        warmup_done.set()
+        log.info("Warm-up finished: %s", warmup_state)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    task = asyncio.create_task(_warm_up())
+    yield
+    task.cancel()
+    master.history.writer.close()
+
+
+async def wait_until_warm():
+    if warmup_done.is_set():
+        return
+    try:
+        await asyncio.wait_for(warmup_done.wait(), timeout=WARMUP_WAIT_S)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=503, detail="Service warming up, retry shortly")
+
 # ==========================
 # 🔹 FastAPI App Setup
 # ==========================
-app = FastAPI(title="6G Multi-Agent Orchestrator")
+app = FastAPI(title="6G Multi-Agent Orchestrator", lifespan=lifespan)
 
 # Allow frontend (e.g., Streamlit or HTML+JS) to access API
 app.add_middleware(
@@ -25,11 +81,62 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# RAG query API (used by the policy guardian via RAG_ENDPOINT)
+app.include_router(rag_router)
+
 # ==========================
 # 🔹 Initialize Master Agent
 # ==========================
 master = MasterAgent()
 
+# ==========================
+# 🔹 Admission Control
+# ==========================
+# Identical concurrent requests share one pipeline run; distinct ones are
+# limited to MAX_CONCURRENCY at a time with a bounded wait queue.
+#
+# The limits are for the whole server. Under serve.py each of the
+# SERVER_WORKERS processes keeps its own state and enforces its share, so the
+# totals hold on average (a client pinned to one worker by keep-alive gets
+# that worker's share). Coalescing only merges requests within one worker.
+SERVER_WORKERS = max(1, int(os.getenv("SERVER_WORKERS", "1")))
+MAX_CONCURRENCY = int(os.getenv("ALLOCATE_MAX_CONCURRENCY", "4"))
+MAX_QUEUE = int(os.getenv("ALLOCATE_MAX_QUEUE", "32"))
+QUEUE_TIMEOUT_S = float(os.getenv("ALLOCATE_QUEUE_TIMEOUT_S", "10"))
+RATE_LIMIT_PER_S = float(os.getenv("RATE_LIMIT_PER_S", "5"))
+RATE_LIMIT_BURST = int(os.getenv("RATE_LIMIT_BURST", "10"))
+# Peers whose X-Forwarded-For is believed (comma-separated IPs of reverse proxies)
+TRUSTED_PROXIES = {p.strip() for p in os.getenv("TRUSTED_PROXIES", "").split(",") if p.strip()}
+
+
+def worker_share(total: int) -> int:
+    """This worker's part of a server-wide limit (rounded up, at least 1)."""
+    return max(1, -(-total // SERVER_WORKERS))
+
+
+admission = AdmissionController(worker_share(MAX_CONCURRENCY), worker_share(MAX_QUEUE), QUEUE_TIMEOUT_S)
+coalescer = SingleFlight()
+rate_limiter = RateLimiter(RATE_LIMIT_PER_S / SERVER_WORKERS, worker_share(RATE_LIMIT_BURST))
+
+
+def client_id(request: Request) -> str:
+    """
+    Rate-limit key: the peer address. Behind a trusted proxy, the nearest
+    X-Forwarded-For hop that isn't itself a trusted proxy.
+    """
+    host = request.client.host if request.client else "anonymous"
+    if host in TRUSTED_PROXIES:
+        hops = [h.strip() for h in request.headers.get("x-forwarded-for", "").split(",") if h.strip()]
+        for hop in reversed(hops):
+            if hop not in TRUSTED_PROXIES:
+                return hop
+    return host
+
+
+async def run_admitted(req: dict) -> dict:
+    async with admission.slot():
+        return await master.run_allocation(req)
+
 # ==========================
 # 🔹 Request Model
 # ==========================
@@ -41,6 +148,18 @@ class AllocationRequest(BaseModel):
     regions: list = None
     bands: list = None
     demand: dict = None
+    mode: str = None              # "pareto" for the multi-objective front, "spatial" for adjacency-aware
+    fairness_weight: float = None
+    alpha: float = None
+    # Solver sizes are capped: they run on the server's CPU and memory
+    pop_size: int = Field(None, ge=2, le=MAX_POP_SIZE)
+    generations: int = Field(None, ge=0, le=MAX_GENERATIONS)
+    time_budget_s: float = Field(None, gt=0, le=PARETO_TIME_BUDGET_S)
+    edges: list = None            # spatial: [[region_a, region_b(, weight)], ...]
+    coordinates: dict = None      # spatial: {region: [lat, lon]}
+    neighbours: int = None
+    conflict_penalty: float = None
+    seed: int = Field(None, ge=0) # default: derived from the request, so repeats are reproducible
 
 # ==========================
 # 🔹 Root Route
@@ -49,15 +168,49 @@ class AllocationRequest(BaseModel):
 def root():
     return {"status": "ok", "message": "6G Multi-Agent Orchestrator running"}
 
+# ==========================
+# 🔹 Health / Readiness
+# ==========================
+@app.get("/healthz")
+def healthz():
+    return {"status": "alive"}
+
+@app.get("/readyz")
+def readyz():
+    ready = all(v == "ready" for v in warmup_state.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"ready": ready, "components": warmup_state, "admission": admission.stats(),
+                 "inflight": len(coalescer)},
+    )
+
 # ==========================
 # 🔹 Allocation Endpoint
 # ==========================
 @app.post("/allocate")
-async def allocate(payload: AllocationRequest):
-    req = payload.dict()
+async def allocate(payload: AllocationRequest, request: Request):
+    client = client_id(request)
+    if not rate_limiter.allow(client):
+        retry = max(1, round(rate_limiter.retry_after(client)))
+        raise HTTPException(status_code=429, detail="Rate limit exceeded", headers={"Retry-After": str(retry)})
+
+    # Unset optional fields are dropped, so agents see them as absent rather than None
+    req = payload.dict(exclude_none=True)
+    await wait_until_warm()
     try:
-        res = await master.run_allocation(req)
+        res = await coalescer.do(canonical_key(req), lambda: run_admitted(req))
         return {"request_id": req.get("request_id"), "result": res}
+    except Overloaded as e:
+        log.warning("Shedding /allocate request: %s (%s)", e, admission.stats())
+        raise HTTPException(status_code=503, detail=f"Server overloaded: {e}", headers={"Retry-After": "1"})
     except Exception as e:
         log.exception("Allocation error")
         raise HTTPException(status_code=500, detail=str(e))
+
+# ==========================
+# 🔹 Allocation History
+# ==========================
+@app.get("/history")
+def history(region: str = None, limit: int = 20):
+    limit = max(1, min(limit, 500))
+    return {"region": region, "allocations": master.history.recent(region=region, limit=limit)}
@@ -0,0 +1,38 @@
+# rag_backend/api.py
+import json
+import asyncio
+from typing import Optional
+
+from fastapi import APIRouter
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from .llm import agenerate_answer, astream_answer
+from .rag_engine import retrieve
+
+router = APIRouter(prefix="/api/rag", tags=["rag"])
+
+
+class RAGQuery(BaseModel):
+    query: str
+    top_k: int = 5
+    generate: bool = True
+    stream: bool = False
+    filters: Optional[dict] = None
+
+
+@router.post("/query")
+async def rag_query(payload: RAGQuery):
+    # Retrieval is CPU-bound (embedding + search): keep it off the event loop
+    retrieved = await asyncio.to_thread(retrieve, payload.query, payload.top_k, filters=payload.filters)
+
+    if payload.generate and payload.stream:
+        sources = [d.get("source") for d in retrieved if d.get("source")]
+        return StreamingResponse(
+            astream_answer(payload.query, retrieved),
+            media_type="text/plain; charset=utf-8",
+            headers={"X-RAG-Sources": json.dumps(sources)},
+        )
+
+    answer = await agenerate_answer(payload.query, retrieved) if payload.generate else ""
+    return {"query": payload.query, "answer": answer, "retrieved": retrieved}
@@ -2,6 +2,7 @@ import streamlit as st
 import pandas as pd
 import random
 import os
+import glob
 
 # ============================================
 # 🔧 Spectrum Allocation Logic (Your Function)
@@ -14,16 +15,27 @@ def allocate_spectrum(request_data):
     }
 
     DATA_PATH = os.path.join("data", "PanIndia_energy.csv")
-    if not os.path.exists(DATA_PATH):
+    PARTITIONS = sorted(glob.glob(os.path.join("data", "energy", "energy-*.parquet")))
+    COLUMNS = ["Jio_Cluster", "Bandwidth_MHz", "Power_Usage_kW", "Energy_Consumption_kWh"]
+    if not PARTITIONS and not os.path.exists(DATA_PATH):
         st.error("Dataset not found. Please ensure PanIndia_energy.csv is in ./data folder.")
         st.stop()
 
-    df = pd.read_csv(DATA_PATH)
-    df.fillna(0, inplace=True)
-
     regions = request_data.get("regions")
     bands = request_data.get("bands", [])
     demand = request_data.get("demand", {r: 1 for r in regions})
+    rng = random.Random(request_data.get("seed"))
+
+    # Columnar partitions (python -m utils.dataset convert): read only the
+    # needed columns and let the reader skip other clusters
+    if PARTITIONS:
+        df = pd.concat([
+            pd.read_parquet(p, columns=COLUMNS, filters=[("cluster_key", "in", [r.lower() for r in regions])])
+            for p in PARTITIONS
+        ], ignore_index=True)
+    else:
+        df = pd.read_csv(DATA_PATH, usecols=COLUMNS, dtype={c: "float32" for c in COLUMNS[1:]})
+    df.fillna(0, inplace=True)
 
     # region metrics
     region_metrics = {}
@@ -46,7 +58,7 @@ def allocate_spectrum(request_data):
     pop_size, gens = 60, 80
 
     def rand_ind():
-        return [random.randrange(len(bands)) for _ in regions]
+        return [rng.randrange(len(bands)) for _ in regions]
 
     def decode(ind):
         return {r: BAND_LABELS.get(bands[i], bands[i]) for r, i in zip(regions, ind)}
@@ -69,12 +81,12 @@ def allocate_spectrum(request_data):
         elites = [i for _, i in scored[:max(2, pop_size // 10)]]
         newpop = elites.copy()
         while len(newpop) < pop_size:
-            p1, p2 = random.sample(elites, 2)
-            cut = random.randint(1, len(regions) - 1)
+            p1, p2 = rng.sample(elites, 2)
+            cut = rng.randint(1, len(regions) - 1)
             child = p1[:cut] + p2[cut:]
-            if random.random() < 0.2:
-                mpos = random.randrange(len(regions))
-                child[mpos] = random.randrange(len(bands))
+            if rng.random() < 0.2:
+                mpos = rng.randrange(len(regions))
+                child[mpos] = rng.randrange(len(bands))
             newpop.append(child)
         population = newpop
 
@@ -98,12 +110,14 @@ regions = st.sidebar.multiselect(
     default=["Maharashtra", "Kerala", "Tamil Nadu"]
 )
 bands = ["low", "mid", "high"]
+seed = int(st.sidebar.number_input("Random seed", min_value=0, value=42, step=1))
+demand_rng = random.Random(seed)
 
 # Generate random demand or let user set manually
 st.sidebar.subheader("📈 Region Demand")
 demand = {}
 for region in regions:
-    demand[region] = st.sidebar.slider(f"{region} Demand", 0.1, 2.0, round(random.uniform(0.5, 1.5), 2))
+    demand[region] = st.sidebar.slider(f"{region} Demand", 0.1, 2.0, round(demand_rng.uniform(0.5, 1.5), 2))
 
 # ---- Main content ----
 col1, col2 = st.columns([2, 1])
@@ -113,7 +127,8 @@ with col1:
             "regions": regions,
             "bands": bands,
             "use_case": "5G Smart Allocation",
-            "demand": demand
+            "demand": demand,
+            "seed": seed,
         }
         allocation, metrics = allocate_spectrum(request_data)
 
@@ -142,10 +157,14 @@ with col1:
 with col2:
     st.subheader("🎲 Simulate Real-Time Request")
     if st.button("🔄 Generate Random Request"):
-        new_demand = {r: round(random.uniform(0.2, 2.0), 2) for r in regions}
-        st.write("🆕 New Random Demand:")
+        # Fresh seed per simulated request; shown so the request can be reproduced
+        sim_seed = random.randrange(2 ** 32)
+        sim_rng = random.Random(sim_seed)
+        new_demand = {r: round(sim_rng.uniform(0.2, 2.0), 2) for r in regions}
+        st.write(f"🆕 New Random Demand (seed {sim_seed}):")
         st.json(new_demand)
-        request_data = {"regions": regions, "bands": bands, "use_case": "Realtime Simulation", "demand": new_demand}
+        request_data = {"regions": regions, "bands": bands, "use_case": "Realtime Simulation", "demand": new_demand,
+                        "seed": sim_seed}
         allocation, _ = allocate_spectrum(request_data)
         st.write("📡 New Allocation:")
         st.json(allocation)
@@ -0,0 +1,108 @@
+# rag_backend/embed_service.py
+import os
+import queue
+import itertools
+import logging
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+log = logging.getLogger("embed-service")
+
+EMBED_MAX_BATCH = int(os.getenv("EMBED_MAX_BATCH", "64"))
+EMBED_TIMEOUT_S = float(os.getenv("EMBED_TIMEOUT_S", "60"))
+
+
+def serve_embeddings(model_name: str, requests, responses: List, max_batch: int = EMBED_MAX_BATCH):
+    """
+    Embedding process main loop: owns the only model copy and answers
+    (worker, req_id, texts, normalize) requests, batching whatever is queued
+    into a single encode call.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    model = SentenceTransformer(model_name)
+    log.info("Embedding service ready (%s, pid %d)", model_name, os.getpid())
+    while True:
+        first = requests.get()
+        if first is None:
+            break
+        batch = [first]
+        while len(batch) < max_batch:
+            try:
+                item = requests.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                requests.put(None)
+                break
+            batch.append(item)
+
+        # Requests with different normalization are encoded separately
+        for normalize in {b[3] for b in batch}:
+            group = [b for b in batch if b[3] == normalize]
+            texts = [t for b in group for t in b[2]]
+            try:
+                vecs = model.encode(texts, convert_to_numpy=True, normalize_embeddings=normalize)
+                error = None
+            except Exception as e:  # reported back to every caller in the group
+                vecs, error = None, repr(e)
+            start = 0
+            for worker, req_id, item_texts, _ in group:
+                n = len(item_texts)
+                payload = vecs[start:start + n] if vecs is not None else None
+                responses[worker].put((req_id, payload, error))
+                start += n
+
+
+class RemoteEmbedder:
+    """
+    Drop-in for SentenceTransformer.encode inside a worker process:
+    forwards texts to the embedding service and waits for the vectors.
+    """
+
+    def __init__(self, worker: int, requests, responses, timeout_s: float = EMBED_TIMEOUT_S):
+        self.worker = worker
+        self.requests = requests
+        self.responses = responses
+        self.timeout_s = timeout_s
+        self._ids = itertools.count()
+        # Keyed by (pid, n): a respawned worker reuses its predecessor's response
+        # queue, and late answers addressed to the dead process must not match
+        self._pending: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+        self._reader: Optional[threading.Thread] = None
+
+    def _read_responses(self):
+        while True:
+            req_id, vecs, error = self.responses.get()
+            with self._lock:
+                slot = self._pending.pop(req_id, None)
+            if slot is not None:
+                slot[1], slot[2] = vecs, error
+                slot[0].set()
+
+    def _ensure_reader(self):
+        with self._lock:
+            if self._reader is None or not self._reader.is_alive():
+                self._reader = threading.Thread(target=self._read_responses, name="embed-responses", daemon=True)
+                self._reader.start()
+
+    def encode(self, sentences, convert_to_numpy=True, normalize_embeddings=False, **kwargs):
+        self._ensure_reader()
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        req_id = (os.getpid(), next(self._ids))
+        slot = [threading.Event(), None, None]
+        with self._lock:
+            self._pending[req_id] = slot
+        self.requests.put((self.worker, req_id, texts, bool(normalize_embeddings)))
+        if not slot[0].wait(self.timeout_s):
+            with self._lock:
+                self._pending.pop(req_id, None)
+            raise TimeoutError("Embedding service did not respond in time")
+        if slot[2] is not None:
+            raise RuntimeError(f"Embedding service error: {slot[2]}")
+        vecs = np.asarray(slot[1])
+        return vecs[0] if single else vecs
@@ -0,0 +1,163 @@
+# rag_backend/lexical.py
+import re
+from pathlib import Path
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+RRF_K = 60
+
+# Numbers, decimal clause ids ("4.12.3"), ranges ("3300-3670") with an
+# optional unit ("26 GHz"), then plain words.
+_TOKEN_RE = re.compile(
+    r"(\d+(?:\.\d+)*)(?:\s*[-–]\s*(\d+(?:\.\d+)*))?\s*(mhz|ghz|khz|hz)?\b|([a-z0-9]*[a-z][a-z0-9]*)"
+)
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to was were which with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased terms. Band and frequency mentions also emit joined forms
+    ("26ghz", "3300-3670mhz") so exact band queries match exactly.
+    """
+    tokens = []
+    for num, upper, unit, word in _TOKEN_RE.findall(text.lower()):
+        if word:
+            if word not in _STOPWORDS:
+                tokens.append(word)
+            continue
+        tokens.append(num)
+        if upper:
+            span = f"{num}-{upper}"
+            tokens.extend((upper, span))
+            if unit:
+                tokens.extend((f"{span}{unit}", f"{num}{unit}", f"{upper}{unit}"))
+        elif unit:
+            tokens.append(f"{num}{unit}")
+        if unit:
+            tokens.append(unit)
+    return tokens
+
+
+class BM25Index:
+    """
+    Inverted index with postings in CSR form (term -> doc ids, term freqs),
+    scored with Okapi BM25. Documents are addressed by their position in
+    the list the index was built from, matching the FAISS row ids.
+    """
+
+    def __init__(self, terms: Sequence[str], indptr: np.ndarray, doc_ids: np.ndarray,
+                 tf: np.ndarray, doc_len: np.ndarray, k1: float = BM25_K1, b: float = BM25_B):
+        self.vocab: Dict[str, int] = {t: i for i, t in enumerate(terms)}
+        self.terms = list(terms)
+        self.indptr = indptr
+        self.doc_ids = doc_ids
+        self.tf = tf
+        self.doc_len = doc_len
+        self.k1 = k1
+        self.b = b
+        n_docs = doc_len.size
+        df = np.diff(indptr).astype(np.float32)
+        self.idf = np.log(1.0 + (n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        avg_len = float(doc_len.mean()) if n_docs else 0.0
+        self.total_len = float(doc_len.sum())
+        self._norm = (k1 * (1.0 - b + b * doc_len / avg_len)).astype(np.float32) if avg_len else doc_len
+
+    @property
+    def n_docs(self) -> int:
+        return int(self.doc_len.size)
+
+    @classmethod
+    def build(cls, texts: Iterable[str]) -> "BM25Index":
+        postings: Dict[str, Dict[int, int]] = {}
+        lengths = []
+        for doc_id, text in enumerate(texts):
+            toks = tokenize(text)
+            lengths.append(len(toks))
+            for t in toks:
+                counts = postings.setdefault(t, {})
+                counts[doc_id] = counts.get(doc_id, 0) + 1
+
+        terms = sorted(postings)
+        indptr = np.zeros(len(terms) + 1, dtype=np.int64)
+        doc_ids, tf = [], []
+        for i, t in enumerate(terms):
+            items = sorted(postings[t].items())
+            doc_ids.extend(d for d, _ in items)
+            tf.extend(min(c, np.iinfo(np.uint16).max) for _, c in items)
+            indptr[i + 1] = len(doc_ids)
+        return cls(terms, indptr, np.array(doc_ids, dtype=np.int32), np.array(tf, dtype=np.uint16),
+                   np.array(lengths, dtype=np.float32))
+
+    def save(self, path: Path):
+        with open(path, "wb") as f:
+            np.savez_compressed(
+                f, terms=np.array(self.terms), indptr=self.indptr, doc_ids=self.doc_ids,
+                tf=self.tf, doc_len=self.doc_len,
+            )
+
+    @classmethod
+    def load(cls, path: Path) -> "BM25Index":
+        with np.load(path, allow_pickle=False) as z:
+            return cls(z["terms"].tolist(), z["indptr"], z["doc_ids"], z["tf"], z["doc_len"])
+
+    def doc_freq(self, term: str) -> int:
+        t = self.vocab.get(term)
+        return 0 if t is None else int(self.indptr[t + 1] - self.indptr[t])
+
+    def scores(self, query: str, corpus: Optional[Dict] = None) -> np.ndarray:
+        """
+        BM25 score of every document. `corpus` (from corpus_stats) replaces
+        this index's own document count, average length and document
+        frequencies, so scores from several shards are comparable.
+        """
+        out = np.zeros(self.n_docs, dtype=np.float32)
+        for term in set(tokenize(query)):
+            t = self.vocab.get(term)
+            if t is None:
+                continue
+            lo, hi = self.indptr[t], self.indptr[t + 1]
+            docs = self.doc_ids[lo:hi]
+            tf = self.tf[lo:hi].astype(np.float32)
+            if corpus is None:
+                idf, norm = self.idf[t], self._norm[docs]
+            else:
+                df = corpus["df"][term]
+                idf = np.log(1.0 + (corpus["n_docs"] - df + 0.5) / (df + 0.5))
+                norm = self.k1 * (1.0 - self.b + self.b * self.doc_len[docs] / corpus["avg_len"])
+            out[docs] += idf * tf * (self.k1 + 1.0) / (tf + norm)
+        return out
+
+    def search(self, query: str, top_k: int = 20) -> Tuple[np.ndarray, np.ndarray]:
+        """Doc ids and scores of the top_k matching documents (score > 0), best first."""
+        s = self.scores(query)
+        hits = np.flatnonzero(s > 0)
+        if hits.size > top_k:
+            hits = hits[np.argpartition(-s[hits], top_k - 1)[:top_k]]
+        hits = hits[np.argsort(-s[hits], kind="stable")]
+        return hits, s[hits]
+
+
+def corpus_stats(indexes: Sequence[BM25Index], query: str) -> Dict:
+    """Document count, average length and per-term document frequencies of the query terms over all `indexes`."""
+    n_docs = sum(ix.n_docs for ix in indexes)
+    total_len = sum(ix.total_len for ix in indexes)
+    return {
+        "n_docs": n_docs,
+        "avg_len": total_len / n_docs if n_docs and total_len else 1.0,
+        "df": {term: sum(ix.doc_freq(term) for ix in indexes) for term in set(tokenize(query))},
+    }
+
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[Hashable]], k: int = RRF_K) -> List[Tuple[Hashable, float]]:
+    """Fuse ranked id lists: score(d) = sum 1 / (k + rank). Best first."""
+    fused: Dict[Hashable, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            key = int(doc_id) if isinstance(doc_id, (int, np.integer)) else doc_id
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(fused.items(), key=lambda x: x[1], reverse=True)
@@ -0,0 +1,262 @@
+# rag_backend/llm.py
+import os
+import abc
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, List, Optional
+
+log = logging.getLogger("rag-llm")
+
+LLM_BACKEND = os.getenv("LLM_BACKEND", "auto")          # auto | openai | stub
+LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+LLM_TEMPERATURE = 0.2
+LLM_MAX_TOKENS = 600
+ANSWER_CACHE_FILE = Path(os.getenv("ANSWER_CACHE_FILE", os.path.join("data", "answer_cache.sqlite")))
+ANSWER_CACHE_TTL_S = float(os.getenv("ANSWER_CACHE_TTL_S", str(24 * 3600)))
+ANSWER_CACHE_PURGE_EVERY = int(os.getenv("ANSWER_CACHE_PURGE_EVERY", "500"))  # expired rows dropped every N writes
+
+# Bump PROMPT_VERSION whenever PROMPT_TEMPLATE changes so cached answers
+# produced by the old template are not served.
+PROMPT_VERSION = "policy-v1"
+PROMPT_TEMPLATE = """You are a telecom + spectrum policy expert.
+Use the context below to answer the user's question and cite the relevant source URLs.
+
+Context:
+{context_text}
+
+Question:
+{query}
+
+Answer (be precise, cite source URLs):"""
+
+
+def build_prompt(query: str, contexts: List[Dict]) -> str:
+    context_text = "\n\n".join(
+        [f"Source: {c.get('source')}\nText: {(c.get('text') or '')[:1200]}..." for c in contexts]
+    )
+    return PROMPT_TEMPLATE.format(context_text=context_text, query=query)
+
+
+# -----------------------------
+# Backends
+# -----------------------------
+class LLMBackend(abc.ABC):
+    """Interface for answer generators; `name` is part of the cache key."""
+    name = "base"
+
+    async def generate(self, prompt: str, contexts: List[Dict]) -> str:
+        parts = [t async for t in self.stream(prompt, contexts)]
+        return "".join(parts).strip()
+
+    @abc.abstractmethod
+    def stream(self, prompt: str, contexts: List[Dict]) -> AsyncIterator[str]:
+        """Answer text in pieces as it is produced (implemented as an async generator)."""
+
+
+class StubBackend(LLMBackend):
+    """
+    Offline backend: answers with the top retrieved snippets (the previous
+    no-API-key behaviour). Deterministic, so it is also used for testing.
+    """
+    name = "stub"
+
+    def answer(self, contexts: List[Dict]) -> str:
+        return "\n\n".join([c.get("text", "") for c in contexts[:3]])
+
+    async def generate(self, prompt: str, contexts: List[Dict]) -> str:
+        return self.answer(contexts)
+
+    async def stream(self, prompt: str, contexts: List[Dict]) -> AsyncIterator[str]:
+        words = self.answer(contexts).split(" ")
+        for i, w in enumerate(words):
+            yield w if i == 0 else " " + w
+            await asyncio.sleep(0)
+
+
+class OpenAIBackend(LLMBackend):
+    """Chat completions through the async OpenAI client (created lazily)."""
+
+    def __init__(self, model: Optional[str] = None, api_key: Optional[str] = None):
+        self.model = model or os.getenv("LLM_MODEL", LLM_MODEL)
+        self.api_key = api_key or os.getenv("OPENAI_API_KEY")
+        self.name = f"openai:{self.model}"
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            from openai import AsyncOpenAI
+            self._client = AsyncOpenAI(api_key=self.api_key)
+        return self._client
+
+    def _request(self, prompt: str, stream: bool) -> Dict:
+        return {
+            "model": self.model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": LLM_TEMPERATURE,
+            "max_tokens": LLM_MAX_TOKENS,
+            "stream": stream,
+        }
+
+    async def generate(self, prompt: str, contexts: List[Dict]) -> str:
+        response = await self.client.chat.completions.create(**self._request(prompt, stream=False))
+        return (response.choices[0].message.content or "").strip()
+
+    async def stream(self, prompt: str, contexts: List[Dict]) -> AsyncIterator[str]:
+        response = await self.client.chat.completions.create(**self._request(prompt, stream=True))
+        async for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+_BACKENDS: Dict[str, Callable[[], LLMBackend]] = {
+    "stub": StubBackend,
+    "openai": OpenAIBackend,
+}
+_backend: Optional[LLMBackend] = None
+
+
+def register_backend(name: str, factory: Callable[[], LLMBackend]):
+    """Make a backend selectable with LLM_BACKEND=<name>."""
+    _BACKENDS[name] = factory
+
+
+def _openai_usable() -> bool:
+    if not os.getenv("OPENAI_API_KEY"):
+        return False
+    try:
+        import openai  # noqa: F401
+    except Exception:
+        return False
+    return True
+
+
+def get_backend() -> LLMBackend:
+    global _backend
+    if _backend is None:
+        name = os.getenv("LLM_BACKEND", LLM_BACKEND)
+        if name == "auto":
+            name = "openai" if _openai_usable() else "stub"
+        if name not in _BACKENDS:
+            raise ValueError(f"Unknown LLM backend: {name}")
+        _backend = _BACKENDS[name]()
+        log.info("Using LLM backend %s", _backend.name)
+    return _backend
+
+
+def set_backend(backend: Optional[LLMBackend]):
+    global _backend
+    _backend = backend
+
+
+# -----------------------------
+# Persistent answer cache
+# -----------------------------
+class AnswerCache:
+    """
+    SQLite-backed answer cache with a TTL, keyed by (prompt version,
+    backend, query, retrieved chunk ids and text hashes). Calls are
+    synchronous and cheap; async callers run them in a thread.
+    """
+
+    def __init__(self, path: Path = ANSWER_CACHE_FILE, ttl_s: float = ANSWER_CACHE_TTL_S,
+                 purge_every: int = ANSWER_CACHE_PURGE_EVERY):
+        self.path = Path(path)
+        self.ttl_s = ttl_s
+        self.purge_every = purge_every
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS answers (key TEXT PRIMARY KEY, answer TEXT, created REAL)"
+            )
+        return self._conn
+
+    @staticmethod
+    def key(backend: str, query: str, contexts: List[Dict]) -> str:
+        # Chunk ids are positional (url::index), so a re-ingested document keeps
+        # its ids; hashing the text makes changed chunks miss the cache
+        chunks = [
+            [c.get("id"), c.get("source"), hashlib.sha1((c.get("text") or "").encode("utf-8")).hexdigest()]
+            for c in contexts
+        ]
+        blob = json.dumps([PROMPT_VERSION, backend, query, chunks], ensure_ascii=False)
+        return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        if self.ttl_s <= 0:
+            return None
+        with self._lock:
+            row = self._db().execute("SELECT answer, created FROM answers WHERE key = ?", (key,)).fetchone()
+        if row is None or time.time() - row[1] > self.ttl_s:
+            return None
+        return row[0]
+
+    def set(self, key: str, answer: str):
+        if self.ttl_s <= 0:
+            return
+        with self._lock:
+            db = self._db()
+            db.execute("INSERT OR REPLACE INTO answers VALUES (?, ?, ?)", (key, answer, time.time()))
+            db.commit()
+            self._writes += 1
+            purge = self.purge_every > 0 and self._writes % self.purge_every == 0
+        if purge:
+            self.purge_expired()
+
+    def purge_expired(self) -> int:
+        with self._lock:
+            db = self._db()
+            cur = db.execute("DELETE FROM answers WHERE created < ?", (time.time() - self.ttl_s,))
+            db.commit()
+        return cur.rowcount
+
+
+answer_cache = AnswerCache()
+
+
+# -----------------------------
+# Generation
+# -----------------------------
+async def agenerate_answer(query: str, contexts: List[Dict], backend: Optional[LLMBackend] = None,
+                           use_cache: bool = True) -> str:
+    backend = backend or get_backend()
+    key = AnswerCache.key(backend.name, query, contexts)
+    if use_cache:
+        cached = await asyncio.to_thread(answer_cache.get, key)
+        if cached is not None:
+            return cached
+    answer = await backend.generate(build_prompt(query, contexts), contexts)
+    if use_cache and answer:
+        await asyncio.to_thread(answer_cache.set, key, answer)
+    return answer
+
+
+async def astream_answer(query: str, contexts: List[Dict], backend: Optional[LLMBackend] = None,
+                         use_cache: bool = True) -> AsyncIterator[str]:
+    """Yield answer tokens as they arrive; a cached answer is yielded whole."""
+    backend = backend or get_backend()
+    key = AnswerCache.key(backend.name, query, contexts)
+    if use_cache:
+        cached = await asyncio.to_thread(answer_cache.get, key)
+        if cached is not None:
+            yield cached
+            return
+    parts = []
+    async for token in backend.stream(build_prompt(query, contexts), contexts):
+        parts.append(token)
+        yield token
+    answer = "".join(parts).strip()
+    if use_cache and answer:
+        await asyncio.to_thread(answer_cache.set, key, answer)
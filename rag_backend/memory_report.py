@@ -0,0 +1,137 @@
+# rag_backend/memory_report.py
+"""
+Measure index and chunk-text memory per storage option and extrapolate to
+one million chunks.
+
+    python -m rag_backend.memory_report --n 100000 --types flat,fp16,sq8,pq
+"""
+import json
+import time
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+from .shards import INDEX_TYPES, RERANK_FACTORS, build_vector_index
+from .textstore import default_codec, write_text_store
+
+PER_MILLION = 1_000_000
+
+
+def _mb(n_bytes: float) -> float:
+    return round(n_bytes / (1024 * 1024), 1)
+
+
+def synthetic_vectors(n: int, dim: int, seed: int = 0) -> np.ndarray:
+    """Unit-norm vectors with some cluster structure, like sentence embeddings."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(1, n // 500), dim)).astype(np.float32)
+    x = centers[rng.integers(len(centers), size=n)] + 0.5 * rng.standard_normal((n, dim)).astype(np.float32)
+    return x / np.linalg.norm(x, axis=1, keepdims=True)
+
+
+def measure_index(kind: str, vectors: np.ndarray, queries: np.ndarray, truth: np.ndarray, k: int = 10) -> dict:
+    import faiss
+
+    started = time.perf_counter()
+    index, built_as = build_vector_index(vectors, kind)
+    build_s = time.perf_counter() - started
+    size = faiss.serialize_index(index).nbytes
+    per_vec = size / vectors.shape[0]
+
+    started = time.perf_counter()
+    _, I = index.search(queries, k)
+    search_ms = (time.perf_counter() - started) * 1000 / len(queries)
+    recall = float(np.mean([len(set(a) & set(b)) / k for a, b in zip(I, truth)]))
+
+    row = {
+        "index_type": built_as,
+        "bytes_per_vector": round(per_vec, 1),
+        "index_mb_per_million": _mb(per_vec * PER_MILLION),
+        "build_s": round(build_s, 2),
+        "search_ms_per_query": round(search_ms, 3),
+        f"recall@{k}": round(recall, 3),
+    }
+    if built_as != "flat":
+        # Rerank candidates with exact vectors (mmap'd on disk when serving)
+        _, C = index.search(queries, k * RERANK_FACTORS.get(built_as, 1))
+        reranked = []
+        for q, cand in zip(queries, C):
+            cand = cand[cand >= 0]
+            dist = ((vectors[cand] - q) ** 2).sum(axis=1)
+            reranked.append(cand[np.argsort(dist)[:k]])
+        row[f"recall@{k}_reranked"] = round(
+            float(np.mean([len(set(a) & set(b)) / k for a, b in zip(reranked, truth)])), 3
+        )
+    return row
+
+
+def measure_texts(texts_file: Path) -> dict:
+    with open(texts_file, "r", encoding="utf-8") as f:
+        docs = json.load(f)
+    texts = [d.get("text", "") for d in docs]
+    meta = [{k: v for k, v in d.items() if k != "text"} for d in docs]
+    on_disk = texts_file.stat().st_size
+
+    meta_bytes = len(json.dumps(meta, ensure_ascii=False).encode("utf-8"))
+    tmp = texts_file.parent / ".memory_report_texts.blk"
+    try:
+        write_text_store(tmp, texts)
+        compressed = tmp.stat().st_size
+    finally:
+        tmp.unlink(missing_ok=True)
+        Path(f"{tmp}.json").unlink(missing_ok=True)
+
+    n = max(1, len(docs))
+    return {
+        "chunks": len(docs),
+        "codec": default_codec(),
+        "json_bytes_per_chunk": round(on_disk / n, 1),
+        "compressed_text_plus_meta_bytes_per_chunk": round((compressed + meta_bytes) / n, 1),
+        "json_mb_per_million": _mb(on_disk / n * PER_MILLION),
+        "compressed_mb_per_million": _mb((compressed + meta_bytes) / n * PER_MILLION),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--n", type=int, default=100_000, help="synthetic vectors to index")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--types", default=",".join(INDEX_TYPES))
+    parser.add_argument("--texts", default="texts_metadata.json", help="chunk JSON to measure text storage on")
+    parser.add_argument("--json", action="store_true", help="print a JSON report instead of a table")
+    args = parser.parse_args(argv)
+
+    import faiss
+
+    vectors = synthetic_vectors(args.n, args.dim)
+    queries = synthetic_vectors(args.queries, args.dim, seed=1)
+    exact = faiss.IndexFlatL2(args.dim)
+    exact.add(vectors)
+    _, truth = exact.search(queries, 10)
+
+    report = {"n": args.n, "dim": args.dim, "indexes": [], "texts": None}
+    for kind in [t.strip() for t in args.types.split(",") if t.strip()]:
+        report["indexes"].append(measure_index(kind, vectors, queries, truth))
+    # Exact vectors for reranking live in a memory-mapped .npy, not in RAM
+    report["exact_vectors_mb_per_million_on_disk"] = _mb(args.dim * 4 * PER_MILLION)
+    if Path(args.texts).exists():
+        report["texts"] = measure_texts(Path(args.texts))
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return report
+
+    print(f"Vector index memory ({args.n} x {args.dim}, extrapolated to 1M chunks)")
+    for row in report["indexes"]:
+        print("  " + "  ".join(f"{k}={v}" for k, v in row.items()))
+    print(f"  exact rerank vectors (mmap, on disk): {report['exact_vectors_mb_per_million_on_disk']} MB per 1M")
+    if report["texts"]:
+        print("Chunk text storage")
+        print("  " + "  ".join(f"{k}={v}" for k, v in report["texts"].items()))
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# rag_backend/metadata.py
+import re
+from datetime import date
+from typing import Dict, List, Optional
+from urllib.parse import unquote, urlparse
+
+# Ordered: first matching rule wins
+DOC_TYPE_RULES = [
+    ("nfap", re.compile(r"national[-_ ]frequency[-_ ]allocation|nfap")),
+    ("gazette", re.compile(r"egazette|gazette")),
+    ("consultation", re.compile(r"consultation|(^|/)cp_")),
+    ("recommendation", re.compile(r"recommendation")),
+    ("response", re.compile(r"response|comment")),
+    ("letter", re.compile(r"letter")),
+]
+DEFAULT_DOC_TYPE = "other"
+
+_DDMMYYYY_RE = re.compile(r"(?<!\d)(\d{2})(\d{2})((?:19|20)\d{2})(?!\d)")
+_YEAR_MONTH_RE = re.compile(r"/((?:19|20)\d{2})[-/](\d{2})/")
+_YEAR_RE = re.compile(r"(?<!\d)((?:19|20)\d{2})(?!\d)")
+
+# "26 GHz", "3300-3670 MHz", "n258" (5G NR band ids)
+_BAND_RE = re.compile(
+    r"(?<![\w.])(\d+(?:\.\d+)?)(?:\s*[-–]\s*(\d+(?:\.\d+)?))?\s*(mhz|ghz)\b|(?<!\w)(n\d{1,3})(?!\w)"
+)
+MAX_BANDS_PER_CHUNK = 32
+
+
+def doc_type_for(url: str) -> str:
+    path = unquote(urlparse(url).netloc + urlparse(url).path).lower()
+    for doc_type, pattern in DOC_TYPE_RULES:
+        if pattern.search(path):
+            return doc_type
+    return DEFAULT_DOC_TYPE
+
+
+def date_for(url: str) -> Optional[str]:
+    """
+    Best-effort publication date from the URL: ddmmyyyy in the file name
+    (TRAI convention), else the /yyyy-mm/ upload folder, else a bare year.
+    """
+    path = unquote(urlparse(url).path)
+    name = path.rsplit("/", 1)[-1]
+    for m in _DDMMYYYY_RE.finditer(name):
+        try:
+            return date(int(m.group(3)), int(m.group(2)), int(m.group(1))).isoformat()
+        except ValueError:
+            continue
+    m = _YEAR_MONTH_RE.search(path)
+    if m:
+        return f"{m.group(1)}-{m.group(2)}"
+    m = _YEAR_RE.search(name) or _YEAR_RE.search(path)
+    return m.group(1) if m else None
+
+
+def normalize_band(band: str) -> str:
+    """Canonical band mention key: "26 GHz" -> "26ghz", "3300 - 3670 MHz" -> "3300-3670mhz"."""
+    return re.sub(r"\s+", "", band.lower()).replace("–", "-")
+
+
+def band_mentions(text: str) -> List[str]:
+    found = []
+    seen = set()
+    for low, high, unit, nr in _BAND_RE.findall(text.lower()):
+        key = nr if nr else (f"{low}-{high}{unit}" if high else f"{low}{unit}")
+        if key not in seen:
+            seen.add(key)
+            found.append(key)
+            if len(found) >= MAX_BANDS_PER_CHUNK:
+                break
+    return found
+
+
+def chunk_metadata(url: str, text: str) -> Dict:
+    return {
+        "doc_type": doc_type_for(url),
+        "date": date_for(url),
+        "bands": band_mentions(text),
+    }
@@ -1,20 +1,24 @@
 # rag_backend/rag_engine.py
 import os
 import json
+import asyncio
 import hashlib
 import logging
+import threading
 from pathlib import Path
 from typing import List, Dict
 
-import requests
-from bs4 import BeautifulSoup
+import numpy as np
 from dotenv import load_dotenv
-from tqdm import tqdm
 
-from pypdf import PdfReader
-import numpy as np
-import faiss
-from sentence_transformers import SentenceTransformer
+from .lexical import BM25Index, reciprocal_rank_fusion
+from .llm import agenerate_answer
+from .metadata import chunk_metadata
+from .shards import ShardedIndex
+
+# Heavy optional dependencies (faiss, sentence-transformers, pypdf, bs4,
+# requests; openai in llm.py) are imported where they are used, so importing this
+# module stays cheap and the server can answer before warm-up completes.
 
 # Load env
 BASE_DIR = Path(os.getcwd())
@@ -22,10 +26,19 @@ DATA_RAW = BASE_DIR / "data" / "raw"
 DATA_PROC = BASE_DIR / "data" / "processed"
 INDEX_FILE = BASE_DIR / "faiss_index.bin"
 TEXTS_FILE = BASE_DIR / "texts_metadata.json"
+BM25_FILE = BASE_DIR / "bm25_index.npz"
+SHARD_DIR = BASE_DIR / "data" / "index"
+SHARD_BY = os.getenv("RAG_SHARD_BY", "doc_type")  # "doc_type" or "source"
+# Shard vector storage: flat (float32), fp16, sq8 or pq; quantized shards
+# rerank candidates against memory-mapped exact vectors.
+INDEX_TYPE = os.getenv("RAG_INDEX_TYPE", "flat")
+COMPRESS_TEXTS = os.getenv("RAG_COMPRESS_TEXTS", "1") not in ("0", "false", "no")
 
 EMBED_MODEL = "all-MiniLM-L6-v2"
 CHUNK_SIZE = 800
 CHUNK_OVERLAP = 150
+# Lexical candidates fused with the vector hits in hybrid retrieval
+LEXICAL_CANDIDATES = 20
 
 # Put your URLs here (same as your Colab list)
 SOURCE_URLS = [
@@ -41,29 +54,54 @@ SOURCE_URLS = [
     "https://egazette.gov.in/WriteReadData/2023/250880.pdf",
 ]
 
-DATA_RAW.mkdir(parents=True, exist_ok=True)
-DATA_PROC.mkdir(parents=True, exist_ok=True)
-
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger("rag-engine")
 
 # Attempt to load OpenAI key if present (optional)
 load_dotenv(BASE_DIR / ".env")
-OPENAI_AVAILABLE = False
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
-try:
-    import openai
-    OPENAI_AVAILABLE = True
-    if OPENAI_API_KEY:
-        openai.api_key = OPENAI_API_KEY
-except Exception:
-    OPENAI_AVAILABLE = False
+
+# Shared, lazily loaded resources (one copy per process)
+_embedders: Dict[str, object] = {}
+_embedder_lock = threading.Lock()
+_index_cache: Dict[str, object] = {}
+_index_lock = threading.Lock()
+_shards = ShardedIndex(SHARD_DIR, SHARD_BY, INDEX_TYPE, COMPRESS_TEXTS)
+
+
+def set_embedder(embedder, model_name=EMBED_MODEL):
+    """
+    Install an object with a SentenceTransformer-compatible encode(), e.g.
+    a RemoteEmbedder talking to a shared embedding process.
+    """
+    with _embedder_lock:
+        _embedders[model_name] = embedder
+
+
+def get_embedder(model_name=EMBED_MODEL):
+    """
+    Process-wide SentenceTransformer, loaded on first use. Concurrent
+    callers wait on the same load instead of each starting their own.
+    """
+    model = _embedders.get(model_name)
+    if model is not None:
+        return model
+    with _embedder_lock:
+        model = _embedders.get(model_name)
+        if model is None:
+            from sentence_transformers import SentenceTransformer
+            log.info("Loading embedding model %s", model_name)
+            model = SentenceTransformer(model_name)
+            _embedders[model_name] = model
+    return model
 
 # Utility functions
 def sha1(text: str) -> str:
     return hashlib.sha1(text.encode("utf-8")).hexdigest()
 
 def download_url(url: str, out_dir: Path) -> Path:
+    import requests
+
     out_dir.mkdir(parents=True, exist_ok=True)
     r = requests.get(url, timeout=30)
     r.raise_for_status()
@@ -79,6 +117,8 @@ def download_url(url: str, out_dir: Path) -> Path:
     return save_path
 
 def extract_text_from_pdf(path: Path) -> str:
+    from pypdf import PdfReader
+
     text_parts = []
     try:
         reader = PdfReader(str(path))
@@ -91,6 +131,8 @@ def extract_text_from_pdf(path: Path) -> str:
     return "\n\n".join(text_parts).strip()
 
 def extract_text_from_html(path: Path) -> str:
+    from bs4 import BeautifulSoup
+
     html = path.read_text(encoding="utf-8", errors="ignore")
     soup = BeautifulSoup(html, "html.parser")
     for s in soup(["script", "style", "noscript"]):
@@ -116,50 +158,80 @@ def chunk_text(text: str, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP) -> List[
     return chunks
 
 # Ingestion + Indexing
+def ingest_url(url: str) -> List[Dict]:
+    """Download one source and return its chunks with metadata."""
+    DATA_RAW.mkdir(parents=True, exist_ok=True)
+    DATA_PROC.mkdir(parents=True, exist_ok=True)
+    try:
+        saved = download_url(url, DATA_RAW)
+    except Exception as e:
+        log.error("Failed to download %s: %s", url, e)
+        return []
+    if str(saved).lower().endswith(".pdf"):
+        full_text = extract_text_from_pdf(saved)
+    else:
+        full_text = extract_text_from_html(saved)
+    if not full_text:
+        log.warning("No text extracted from %s", saved)
+        return []
+    chunks = []
+    for i, c in enumerate(chunk_text(full_text)):
+        doc_id = sha1(f"{url}::{i}")
+        chunks.append({
+            "id": doc_id,
+            "text": c,
+            "source": url,
+            "local_path": str(saved),
+            "chunk_index": i,
+            **chunk_metadata(url, c),
+        })
+    return chunks
+
 def ingest_all(urls: List[str]) -> List[Dict]:
+    from tqdm import tqdm
+
     all_chunks = []
     for url in tqdm(urls, desc="Downloading and ingesting"):
-        try:
-            saved = download_url(url, DATA_RAW)
-        except Exception as e:
-            log.error("Failed to download %s: %s", url, e)
-            continue
-        if str(saved).lower().endswith(".pdf"):
-            full_text = extract_text_from_pdf(saved)
-        else:
-            full_text = extract_text_from_html(saved)
-        if not full_text:
-            log.warning("No text extracted from %s", saved)
-            continue
-        chunks = chunk_text(full_text)
-        for i, c in enumerate(chunks):
-            doc_id = sha1(f"{url}::{i}")
-            all_chunks.append({
-                "id": doc_id,
-                "text": c,
-                "source": url,
-                "local_path": str(saved),
-                "chunk_index": i
-            })
+        all_chunks.extend(ingest_url(url))
     log.info("Ingested total chunks: %d", len(all_chunks))
     return all_chunks
 
 def build_faiss_index(docs: List[Dict], model_name=EMBED_MODEL):
     if not docs:
         raise ValueError("No docs provided to build index.")
-    model = SentenceTransformer(model_name)
+    model = get_embedder(model_name)
     texts = [d["text"] for d in docs]
     embeddings = model.encode(texts, show_progress_bar=True, convert_to_numpy=True)
-    dim = embeddings.shape[1]
-    log.info("Embedding dimension: %d", dim)
-    index = faiss.IndexFlatL2(dim)
+    log.info("Embedding dimension: %d", embeddings.shape[1])
+    save_flat_index(docs, embeddings)
+    _shards.build(docs, embeddings)
+
+def save_flat_index(docs: List[Dict], embeddings: np.ndarray):
+    """Write the flat FAISS index, its texts/metadata and the BM25 index over the same chunks."""
+    import faiss
+
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    index = faiss.IndexFlatL2(embeddings.shape[1])
     index.add(embeddings)
     faiss.write_index(index, str(INDEX_FILE))
     with open(TEXTS_FILE, "w", encoding="utf-8") as f:
-        json.dump(docs, f, ensure_ascii=False, indent=2)
+        json.dump(docs, f, ensure_ascii=False)
     log.info("Saved FAISS index -> %s and metadata -> %s", INDEX_FILE, TEXTS_FILE)
+    with _index_lock:
+        _index_cache.clear()
+    build_lexical_index(docs)
+
+def build_lexical_index(docs: List[Dict]):
+    bm25 = BM25Index.build(d.get("text", "") for d in docs)
+    bm25.save(BM25_FILE)
+    log.info("Saved BM25 index (%d terms) -> %s", len(bm25.terms), BM25_FILE)
+    with _index_lock:
+        _index_cache["bm25"] = bm25
+    return bm25
 
 def load_index():
+    import faiss
+
     if not Path(INDEX_FILE).exists() or not Path(TEXTS_FILE).exists():
         raise FileNotFoundError("Index or texts metadata not found. Build index first.")
     index = faiss.read_index(str(INDEX_FILE))
@@ -167,14 +239,121 @@ def load_index():
         docs = json.load(f)
     return index, docs
 
+def get_index():
+    """
+    Cached (index, docs) pair, loaded once per process and reset when the
+    index is rebuilt.
+    """
+    cached = _index_cache.get("flat")
+    if cached is not None:
+        return cached
+    with _index_lock:
+        cached = _index_cache.get("flat")
+        if cached is None:
+            cached = load_index()
+            _index_cache["flat"] = cached
+    return cached
+
+def get_lexical_index() -> BM25Index:
+    """
+    Cached BM25 index over the same chunks as the FAISS index. Built from
+    the stored texts (no embedding or network needed) if the file is missing.
+    """
+    cached = _index_cache.get("bm25")
+    if cached is not None:
+        return cached
+    if Path(BM25_FILE).exists():
+        with _index_lock:
+            cached = _index_cache.get("bm25")
+            if cached is None:
+                cached = BM25Index.load(BM25_FILE)
+                _index_cache["bm25"] = cached
+        return cached
+    _, docs = get_index()
+    return build_lexical_index(docs)
+
+def get_shards() -> ShardedIndex:
+    return _shards
+
+def build_shards_from_flat(only: List[str] = None):
+    """
+    Split the flat index into shards, adding metadata to chunks that predate
+    it. Vectors are reconstructed from the flat index, so nothing is
+    re-downloaded or re-embedded.
+    """
+    index, docs = get_index()
+    _shards.build([_with_metadata(d) for d in docs], index.reconstruct_n(0, index.ntotal), only=only)
+
+def _with_metadata(doc: Dict) -> Dict:
+    return doc if "doc_type" in doc else {**doc, **chunk_metadata(doc.get("source", ""), doc.get("text", ""))}
+
+def _replace_in_flat(drop, docs: List[Dict], embeddings: np.ndarray):
+    """
+    Swap chunks in the flat index too: it is the source for
+    build_shards_from_flat, so it must not fall behind the shards.
+    """
+    if not (Path(INDEX_FILE).exists() and Path(TEXTS_FILE).exists()):
+        return
+    index, flat_docs = load_index()
+    keep = [i for i, d in enumerate(flat_docs) if not drop(d)]
+    vectors = index.reconstruct_n(0, index.ntotal)[keep] if keep else np.empty((0, embeddings.shape[1]))
+    save_flat_index([flat_docs[i] for i in keep] + docs, np.concatenate([vectors, embeddings]))
+
+def rebuild_shard(name: str, model_name=EMBED_MODEL):
+    """Re-ingest and re-embed the sources of one shard; other shards are untouched."""
+    sources = _shards.get(name).manifest.get("sources", [])
+    docs = [d for url in sources for d in ingest_url(url) if _shards.shard_name(d) == name]
+    if not docs:
+        raise RuntimeError(f"No text extracted for shard {name}.")
+    embeddings = get_embedder(model_name).encode([d["text"] for d in docs], convert_to_numpy=True)
+    _shards.write_shard(name, docs, embeddings)
+    _replace_in_flat(lambda d: _shards.shard_name(_with_metadata(d)) == name, docs, embeddings)
+
+def add_document(url: str, model_name=EMBED_MODEL) -> int:
+    """
+    Ingest (or refresh) one source URL. Only the shard(s) holding it are
+    rebuilt; the flat index is updated to match. Returns the number of
+    chunks indexed.
+    """
+    docs = ingest_url(url)
+    if not docs:
+        raise RuntimeError(f"No text extracted from {url}.")
+    embeddings = get_embedder(model_name).encode([d["text"] for d in docs], convert_to_numpy=True)
+    _shards.replace_source(url, docs, embeddings)
+    _replace_in_flat(lambda d: d.get("source") == url, docs, embeddings)
+    return len(docs)
+
 # Retrieval + generation
-def retrieve(query: str, top_k=5, model_name=EMBED_MODEL):
-    model = SentenceTransformer(model_name)
+def retrieve(query: str, top_k=5, model_name=EMBED_MODEL, hybrid: bool = True,
+             lexical_k: int = LEXICAL_CANDIDATES, filters: Dict = None):
+    """
+    Top-k chunks for `query`. In hybrid mode the vector hits are fused with
+    BM25 hits by reciprocal rank fusion, so exact band names, circular
+    numbers and clause ids are found without over-fetching vectors.
+
+    `filters` (doc_type, source, bands, date_from, date_to) restrict the
+    search to matching chunks, and only the shards that can hold them are
+    searched.
+    """
+    model = get_embedder(model_name)
     qv = model.encode([query], convert_to_numpy=True)
-    index, docs = load_index()
+    if _shards.exists():
+        return _shards.search(qv, query, top_k, filters=filters, hybrid=hybrid, lexical_k=lexical_k)
+
+    if filters:
+        log.warning("No shards built — ignoring retrieval filters %s", filters)
+    index, docs = get_index()
     D, I = index.search(qv, top_k)
+    vector_ids = [int(i) for i in I[0] if 0 <= i < len(docs)]
+
+    if hybrid:
+        lexical_ids, _ = get_lexical_index().search(query, max(lexical_k, top_k))
+        ranked = reciprocal_rank_fusion([vector_ids, lexical_ids])[:top_k]
+    else:
+        ranked = [(i, float(-d)) for i, d in zip(vector_ids, D[0])]
+
     results = []
-    for i in I[0]:
+    for i, score in ranked:
         if 0 <= i < len(docs):
             d = docs[i]
             # optionally trim text to reduce payload
@@ -182,47 +361,50 @@ def retrieve(query: str, top_k=5, model_name=EMBED_MODEL):
                 "id": d.get("id"),
                 "text": d.get("text"),
                 "source": d.get("source"),
-                "chunk_index": d.get("chunk_index")
+                "chunk_index": d.get("chunk_index"),
+                "score": round(float(score), 6),
             }
             results.append(d_copy)
     return results
 
 def rag_generate_answer(query: str, contexts: List[Dict]):
-    # If OpenAI available, call ChatCompletion; otherwise return concatenated contexts
-    if OPENAI_AVAILABLE and OPENAI_API_KEY:
-        context_text = "\n\n".join(
-            [f"Source: {c.get('source')}\nText: {c.get('text')[:1200]}..." for c in contexts]
-        )
-        prompt = f"""You are a telecom + spectrum policy expert.
-Use the context below to answer the user's question and cite the relevant source URLs.
-
-Context:
-{context_text}
-
-Question:
-{query}
-
-Answer (be precise, cite source URLs):"""
-        import openai
-        response = openai.ChatCompletion.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.2,
-            max_tokens=600
-        )
-        return response["choices"][0]["message"]["content"].strip()
-    else:
-        # fallback: return context snippets joined
-        return "\n\n".join([c.get("text", "") for c in contexts[:3]])
+    """
+    Blocking wrapper for scripts. Async callers (FastAPI handlers) should
+    await llm.agenerate_answer / llm.astream_answer instead.
+    """
+    return asyncio.run(agenerate_answer(query, contexts))
 
 def ensure_index(urls: List[str] = None):
     if urls is None:
         urls = SOURCE_URLS
     if Path(INDEX_FILE).exists() and Path(TEXTS_FILE).exists():
         log.info("Index already exists — loading.")
+        if not Path(BM25_FILE).exists():
+            log.info("No BM25 index found — building from stored texts.")
+            build_lexical_index(get_index()[1])
+        if not _shards.exists():
+            log.info("No shards found — splitting the flat index.")
+            build_shards_from_flat()
         return
     log.info("No existing index found — building from source URLs.")
     docs = ingest_all(urls)
     if not docs:
         raise RuntimeError("No text extracted from any documents.")
     build_faiss_index(docs)
+
+
+def warm_up(model_name=EMBED_MODEL, build_missing: bool = True, load_model: bool = True):
+    """
+    Load the embedding model and index into this process. Meant to run in a
+    background thread at startup; building a missing index downloads the
+    source documents, so it can take minutes.
+    """
+    if load_model:
+        get_embedder(model_name)
+    if build_missing:
+        ensure_index()
+    if _shards.exists():
+        _shards.load_all()
+    else:
+        get_index()
+        get_lexical_index()
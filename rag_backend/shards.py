@@ -0,0 +1,389 @@
+# rag_backend/shards.py
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from .lexical import BM25Index, corpus_stats, reciprocal_rank_fusion
+from .metadata import normalize_band
+from .textstore import TextStore, write_text_store
+
+log = logging.getLogger("rag-shards")
+
+SHARD_INDEX = "index.bin"
+SHARD_TEXTS = "texts.json"          # legacy: metadata + full text in one JSON
+SHARD_META = "meta.json"            # chunk metadata without text
+SHARD_TEXT_BLOCKS = "texts.blk"     # block-compressed chunk text
+SHARD_VECTORS = "vectors.npy"       # exact float32 vectors, memory-mapped
+SHARD_BM25 = "bm25.npz"
+SHARD_MANIFEST = "manifest.json"
+
+INDEX_TYPES = ("flat", "fp16", "sq8", "pq")
+PQ_SUBQUANTIZERS = 48               # 384-d MiniLM -> 8 dims per sub-vector
+PQ_MIN_TRAIN = 39 * 256             # FAISS wants 39 training points per centroid (2^8 per sub-quantizer); fewer fall back to sq8
+# Quantized candidates rescored with exact vectors per requested result
+RERANK_FACTORS = {"fp16": 2, "sq8": 4, "pq": 16}
+
+
+def build_vector_index(embeddings: np.ndarray, index_type: str = "flat"):
+    """
+    FAISS L2 index over `embeddings`: exact float32, scalar-quantized
+    (fp16: 2 bytes/dim, sq8: 1 byte/dim) or product-quantized (pq:
+    PQ_SUBQUANTIZERS bytes/vector).
+    """
+    import faiss
+
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unsupported index type: {index_type}")
+    n, dim = embeddings.shape
+    if index_type == "pq" and (n < PQ_MIN_TRAIN or dim % PQ_SUBQUANTIZERS):
+        log.info("Too few vectors (%d) or incompatible dim for PQ, using sq8", n)
+        index_type = "sq8"
+
+    if index_type == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif index_type == "fp16":
+        index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_fp16)
+    elif index_type == "sq8":
+        index = faiss.IndexScalarQuantizer(dim, faiss.ScalarQuantizer.QT_8bit)
+    else:
+        index = faiss.IndexPQ(dim, PQ_SUBQUANTIZERS, 8)
+    if not index.is_trained:
+        index.train(embeddings)
+    index.add(embeddings)
+    return index, index_type
+
+
+def _as_set(value) -> Optional[set]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return {value}
+    return set(value)
+
+
+def normalize_filters(filters: Optional[Dict]) -> Dict:
+    """
+    Accepted keys: doc_type, source, bands (any-of, e.g. "26 GHz"),
+    date_from / date_to (ISO prefixes, inclusive).
+    """
+    filters = filters or {}
+    out = {}
+    for key in ("doc_type", "source"):
+        if filters.get(key):
+            out[key] = _as_set(filters[key])
+    if filters.get("bands"):
+        out["bands"] = {normalize_band(b) for b in _as_set(filters["bands"])}
+    for key in ("date_from", "date_to"):
+        if filters.get(key):
+            out[key] = str(filters[key])
+    return out
+
+
+def doc_matches(doc: Dict, filters: Dict) -> bool:
+    if "doc_type" in filters and doc.get("doc_type") not in filters["doc_type"]:
+        return False
+    if "source" in filters and doc.get("source") not in filters["source"]:
+        return False
+    if "bands" in filters and not filters["bands"].intersection(doc.get("bands") or ()):
+        return False
+    d = doc.get("date")
+    if "date_from" in filters and (d is None or d < filters["date_from"]):
+        return False
+    if "date_to" in filters and (d is None or d[: len(filters["date_to"])] > filters["date_to"]):
+        return False
+    return True
+
+
+# -----------------------------
+# One shard on disk
+# -----------------------------
+class Shard:
+    def __init__(self, name: str, index, meta: List[Dict], texts, bm25: BM25Index, manifest: Dict,
+                 exact: Optional[np.ndarray] = None):
+        self.name = name
+        self.index = index
+        self.meta = meta
+        self.texts = texts
+        self.bm25 = bm25
+        self.manifest = manifest
+        self.exact = exact
+
+    @classmethod
+    def load(cls, path: Path) -> "Shard":
+        import faiss
+
+        index = faiss.read_index(str(path / SHARD_INDEX))
+        with open(path / SHARD_MANIFEST, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        if (path / SHARD_META).exists():
+            with open(path / SHARD_META, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            texts = TextStore(path / SHARD_TEXT_BLOCKS)
+        else:
+            with open(path / SHARD_TEXTS, "r", encoding="utf-8") as f:
+                docs = json.load(f)
+            texts = [d.pop("text", "") for d in docs]
+            meta = docs
+        exact = np.load(path / SHARD_VECTORS, mmap_mode="r") if (path / SHARD_VECTORS).exists() else None
+        return cls(path.name, index, meta, texts, BM25Index.load(path / SHARD_BM25), manifest, exact)
+
+    @property
+    def quantized(self) -> bool:
+        return self.manifest.get("index_type", "flat") != "flat"
+
+    def doc(self, i: int) -> Dict:
+        return {**self.meta[i], "text": self.texts[i]}
+
+    def docs(self) -> List[Dict]:
+        texts = self.texts.all() if isinstance(self.texts, TextStore) else self.texts
+        return [{**m, "text": t} for m, t in zip(self.meta, texts)]
+
+    def may_match(self, filters: Dict) -> bool:
+        """Manifest-level pruning: skip shards that cannot contain a match."""
+        m = self.manifest
+        if "doc_type" in filters and not filters["doc_type"].intersection(m.get("doc_types", [])):
+            return False
+        if "source" in filters and not filters["source"].intersection(m.get("sources", [])):
+            return False
+        if "bands" in filters and not filters["bands"].intersection(m.get("bands", [])):
+            return False
+        return True
+
+    def allowed_ids(self, filters: Dict) -> Optional[np.ndarray]:
+        if not filters:
+            return None
+        ids = np.array([i for i, d in enumerate(self.meta) if doc_matches(d, filters)], dtype=np.int64)
+        return None if ids.size == len(self.meta) else ids
+
+    def vectors(self) -> np.ndarray:
+        if self.exact is not None:
+            return np.asarray(self.exact)
+        return self.index.reconstruct_n(0, self.index.ntotal)
+
+    def vector_search(self, query_vec: np.ndarray, k: int, allowed: Optional[np.ndarray] = None):
+        """
+        (distances, ids) of the k nearest chunks. Quantized shards fetch
+        k * RERANK_FACTORS[type] candidates and rescore them with the exact
+        vectors.
+        """
+        import faiss
+
+        limit = self.index.ntotal if allowed is None else allowed.size
+        rerank = self.quantized and self.exact is not None
+        factor = RERANK_FACTORS.get(self.manifest.get("index_type"), 1) if rerank else 1
+        fetch = min(limit, k * factor)
+        params = faiss.SearchParameters(sel=faiss.IDSelectorBatch(allowed)) if allowed is not None else None
+        D, I = self.index.search(query_vec, fetch, params=params)
+        D, I = D[0], I[0]
+        keep = I >= 0
+        D, I = D[keep], I[keep]
+        if rerank and I.size:
+            rows = np.sort(I)
+            exact = np.asarray(self.exact[rows], dtype=np.float32)
+            dist = ((exact - query_vec[0]) ** 2).sum(axis=1)
+            order = np.argsort(dist, kind="stable")[:k]
+            return dist[order], rows[order]
+        return D[:k], I[:k]
+
+
+# -----------------------------
+# Collection of shards
+# -----------------------------
+class ShardedIndex:
+    """
+    Per-source or per-doc-type FAISS + BM25 shards under `root`, each with a
+    manifest of the doc types, sources and band mentions it holds. Queries
+    search only shards whose manifest can satisfy the filters, and a shard
+    is rebuilt independently of the others.
+    """
+
+    def __init__(self, root: Path, shard_by: str = "doc_type", index_type: str = "flat",
+                 compress_texts: bool = True):
+        if shard_by not in ("doc_type", "source"):
+            raise ValueError(f"Unsupported shard key: {shard_by}")
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unsupported index type: {index_type}")
+        self.root = Path(root)
+        self.shard_by = shard_by
+        self.index_type = index_type
+        self.compress_texts = compress_texts
+        self._cache: Dict[str, Shard] = {}
+        self._lock = threading.Lock()
+
+    def shard_name(self, doc: Dict) -> str:
+        if self.shard_by == "source":
+            return "src-" + hashlib.sha1(doc.get("source", "").encode("utf-8")).hexdigest()[:12]
+        return doc.get("doc_type") or "other"
+
+    def exists(self) -> bool:
+        return bool(self.names())
+
+    def names(self) -> List[str]:
+        if not self.root.exists():
+            return []
+        return sorted(p.name for p in self.root.iterdir() if (p / SHARD_MANIFEST).exists())
+
+    def get(self, name: str) -> Shard:
+        shard = self._cache.get(name)
+        if shard is not None:
+            return shard
+        with self._lock:
+            shard = self._cache.get(name)
+            if shard is None:
+                shard = Shard.load(self.root / name)
+                self._cache[name] = shard
+        return shard
+
+    def load_all(self):
+        for name in self.names():
+            self.get(name)
+
+    # ---------- building ----------
+    def write_shard(self, name: str, docs: List[Dict], embeddings: np.ndarray):
+        import faiss
+
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        index, index_type = build_vector_index(embeddings, self.index_type)
+
+        tmp = self.root / f".{name}.tmp-{os.getpid()}"
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+        faiss.write_index(index, str(tmp / SHARD_INDEX))
+        np.save(tmp / SHARD_VECTORS, embeddings)
+        texts = [d.get("text", "") for d in docs]
+        if self.compress_texts:
+            with open(tmp / SHARD_META, "w", encoding="utf-8") as f:
+                json.dump([{k: v for k, v in d.items() if k != "text"} for d in docs], f, ensure_ascii=False)
+            write_text_store(tmp / SHARD_TEXT_BLOCKS, texts)
+        else:
+            with open(tmp / SHARD_TEXTS, "w", encoding="utf-8") as f:
+                json.dump(docs, f, ensure_ascii=False)
+        BM25Index.build(texts).save(tmp / SHARD_BM25)
+        manifest = {
+            "name": name,
+            "count": len(docs),
+            "index_type": index_type,
+            "compressed_texts": self.compress_texts,
+            "doc_types": sorted({d.get("doc_type") or "other" for d in docs}),
+            "sources": sorted({d.get("source", "") for d in docs}),
+            "bands": sorted({b for d in docs for b in d.get("bands") or ()}),
+            "built_at": time.time(),
+        }
+        with open(tmp / SHARD_MANIFEST, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+        # Swap directories so readers never see a half-written shard
+        final, old = self.root / name, self.root / f".{name}.old-{os.getpid()}"
+        if final.exists():
+            final.rename(old)
+        tmp.rename(final)
+        shutil.rmtree(old, ignore_errors=True)
+        with self._lock:
+            self._cache.pop(name, None)
+        log.info("Built shard %s (%d chunks)", name, len(docs))
+
+    def build(self, docs: List[Dict], embeddings: np.ndarray, only: Optional[Iterable[str]] = None):
+        groups: Dict[str, List[int]] = {}
+        for i, d in enumerate(docs):
+            groups.setdefault(self.shard_name(d), []).append(i)
+        wanted = set(only) if only is not None else None
+        for name, rows in groups.items():
+            if wanted is None or name in wanted:
+                self.write_shard(name, [docs[i] for i in rows], embeddings[rows])
+        if wanted is None:
+            # A full rebuild replaces the whole set: drop shards the corpus no longer produces
+            for name in set(self.names()) - set(groups):
+                shutil.rmtree(self.root / name, ignore_errors=True)
+                with self._lock:
+                    self._cache.pop(name, None)
+                log.info("Removed stale shard %s", name)
+
+    def replace_source(self, source: str, docs: List[Dict], embeddings: np.ndarray):
+        """
+        Swap in the chunks of one source document, rebuilding only the
+        shard(s) that hold it.
+        """
+        names = {self.shard_name(d) for d in docs}
+        for name in self.names():
+            if source in self.get(name).manifest.get("sources", []):
+                names.add(name)
+
+        for name in names:
+            keep_docs, keep_vecs = [], []
+            if (self.root / name / SHARD_MANIFEST).exists():
+                shard = self.get(name)
+                vecs = shard.vectors()
+                rows = [i for i, d in enumerate(shard.meta) if d.get("source") != source]
+                keep_docs = [shard.doc(i) for i in rows]
+                keep_vecs = [vecs[rows]]
+            new_rows = [i for i, d in enumerate(docs) if self.shard_name(d) == name]
+            all_docs = keep_docs + [docs[i] for i in new_rows]
+            if not all_docs:
+                shutil.rmtree(self.root / name, ignore_errors=True)
+                with self._lock:
+                    self._cache.pop(name, None)
+                continue
+            all_vecs = np.concatenate(keep_vecs + [embeddings[new_rows]])
+            self.write_shard(name, all_docs, all_vecs)
+
+    # ---------- search ----------
+    def search(self, query_vec: np.ndarray, query: str, top_k: int = 5, filters: Optional[Dict] = None,
+               hybrid: bool = True, lexical_k: int = 20) -> List[Dict]:
+        query_vec = np.ascontiguousarray(query_vec, dtype=np.float32)
+        filters = normalize_filters(filters)
+        vector_hits, lexical_hits = [], []
+        # BM25 statistics over every shard (not just the ones searched), so
+        # scores are comparable across shards and merge into one ranking
+        shards = {name: self.get(name) for name in self.names()}
+        corpus = corpus_stats([s.bm25 for s in shards.values()], query) if hybrid else None
+        for name, shard in shards.items():
+            if not shard.may_match(filters):
+                continue
+            allowed = shard.allowed_ids(filters)
+            if allowed is not None and allowed.size == 0:
+                continue
+
+            D, I = shard.vector_search(query_vec, top_k, allowed)
+            vector_hits.extend((float(d), (name, int(i))) for d, i in zip(D, I))
+
+            if hybrid:
+                scores = shard.bm25.scores(query, corpus)
+                if allowed is not None:
+                    mask = np.zeros(scores.size, dtype=bool)
+                    mask[allowed] = True
+                    scores = np.where(mask, scores, 0.0)
+                hits = np.flatnonzero(scores > 0)
+                hits = hits[np.argsort(-scores[hits], kind="stable")[:lexical_k]]
+                lexical_hits.extend((-float(scores[i]), (name, int(i))) for i in hits)
+
+        vector_ranking = [key for _, key in sorted(vector_hits)[:top_k]]
+        if hybrid:
+            lexical_ranking = [key for _, key in sorted(lexical_hits)[: max(lexical_k, top_k)]]
+            ranked = reciprocal_rank_fusion([vector_ranking, lexical_ranking])[:top_k]
+        else:
+            dist = dict((key, d) for d, key in vector_hits)
+            ranked = [(key, -dist[key]) for key in vector_ranking]
+
+        results = []
+        for (name, i), score in ranked:
+            d = shards[name].doc(i)
+            results.append({
+                "id": d.get("id"),
+                "text": d.get("text"),
+                "source": d.get("source"),
+                "chunk_index": d.get("chunk_index"),
+                "doc_type": d.get("doc_type"),
+                "date": d.get("date"),
+                "bands": d.get("bands", []),
+                "shard": name,
+                "score": round(float(score), 6),
+            })
+        return results
@@ -0,0 +1,104 @@
+# rag_backend/textstore.py
+import json
+import zlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Sequence
+
+# zstd when the optional `zstandard` package is installed, zlib otherwise
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+TEXT_BLOCK_SIZE = 32
+TEXT_BLOCK_CACHE = 64
+ZSTD_LEVEL = 9
+ZLIB_LEVEL = 9
+
+
+def default_codec() -> str:
+    return "zstd" if zstandard is not None else "zlib"
+
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return zlib.compress(data, ZLIB_LEVEL)
+
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Text store was written with zstd; install `zstandard` to read it.")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+def write_text_store(path: Path, texts: Sequence[str], block_size: int = TEXT_BLOCK_SIZE, codec: str = None):
+    """
+    Write texts as independently compressed blocks of `block_size` entries
+    to `path`, with block offsets in `path` + ".json".
+    """
+    codec = codec or default_codec()
+    offsets = [0]
+    with open(path, "wb") as f:
+        for start in range(0, len(texts), block_size):
+            blob = json.dumps(list(texts[start:start + block_size]), ensure_ascii=False).encode("utf-8")
+            f.write(_compress(blob, codec))
+            offsets.append(f.tell())
+    with open(f"{path}.json", "w", encoding="utf-8") as f:
+        json.dump({"codec": codec, "block_size": block_size, "count": len(texts), "offsets": offsets}, f)
+
+
+class TextStore:
+    """
+    Random access to a block-compressed text file; only the blocks that are
+    read get decompressed, and the most recent ones are kept in an LRU.
+    """
+
+    def __init__(self, path: Path, cache_blocks: int = TEXT_BLOCK_CACHE):
+        self.path = Path(path)
+        with open(f"{self.path}.json", "r", encoding="utf-8") as f:
+            header = json.load(f)
+        self.codec = header["codec"]
+        self.block_size = header["block_size"]
+        self.count = header["count"]
+        self.offsets = header["offsets"]
+        self._cache: "OrderedDict[int, List[str]]" = OrderedDict()
+        self._cache_blocks = cache_blocks
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.count
+
+    def _block(self, b: int) -> List[str]:
+        with self._lock:
+            block = self._cache.get(b)
+            if block is not None:
+                self._cache.move_to_end(b)
+                return block
+        with open(self.path, "rb") as f:
+            f.seek(self.offsets[b])
+            raw = f.read(self.offsets[b + 1] - self.offsets[b])
+        block = json.loads(_decompress(raw, self.codec).decode("utf-8"))
+        with self._lock:
+            self._cache[b] = block
+            if len(self._cache) > self._cache_blocks:
+                self._cache.popitem(last=False)
+        return block
+
+    def get(self, i: int) -> str:
+        if not 0 <= i < self.count:
+            raise IndexError(i)
+        return self._block(i // self.block_size)[i % self.block_size]
+
+    def __getitem__(self, i: int) -> str:
+        return self.get(i)
+
+    def all(self) -> List[str]:
+        out = []
+        for b in range(len(self.offsets) - 1):
+            out.extend(self._block(b))
+        return out
@@ -0,0 +1,142 @@
+# serve.py
+"""
+Pre-fork multi-worker server.
+
+The parent loads the read-only assets once (embedding model, FAISS/BM25
+shards, energy dataset), freezes them out of the garbage collector and
+forks the workers, which share those pages copy-on-write. Shard vectors
+used for reranking are memory-mapped, so all workers share the page cache.
+
+With --embed-service the model is not loaded in the parent at all. A single
+embedding process owns it and serves every worker over a local queue, so
+only one copy of the model exists however many workers run.
+
+Admission and rate limits (ALLOCATE_MAX_CONCURRENCY, RATE_LIMIT_PER_S, ...)
+are server-wide totals, divided between the workers; identical concurrent
+/allocate requests are only coalesced when they reach the same worker.
+
+    python serve.py --workers 4
+    python serve.py --workers 8 --embed-service
+"""
+import os
+import gc
+import signal
+import socket
+import logging
+import argparse
+import multiprocessing as mp
+from multiprocessing.connection import wait
+
+from rag_backend.embed_service import RemoteEmbedder, serve_embeddings
+from rag_backend.rag_engine import EMBED_MODEL, set_embedder
+
+logging.basicConfig(level=logging.INFO)
+log = logging.getLogger("6g-serve")
+
+
+def preload(load_model: bool):
+    from agents.smart_allocator import load_dataset
+    from rag_backend.rag_engine import warm_up
+
+    # Failures are not fatal: workers retry lazily, as after a failed warm-up
+    for name, fn in (("rag", lambda: warm_up(load_model=load_model)), ("dataset", load_dataset)):
+        try:
+            fn()
+        except Exception as e:
+            log.warning("Could not preload %s: %s", name, e)
+
+
+def run_worker(sock: socket.socket, worker_id: int, args, embed_requests, embed_responses):
+    if embed_requests is not None:
+        set_embedder(RemoteEmbedder(worker_id, embed_requests, embed_responses[worker_id]))
+    try:
+        import torch
+        torch.set_num_threads(max(1, (os.cpu_count() or 1) // args.workers))
+    except ImportError:
+        pass
+
+    import uvicorn
+    import main
+
+    config = uvicorn.Config(main.app, log_level=args.log_level, lifespan="on")
+    uvicorn.Server(config).run(sockets=[sock])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--embed-service", action="store_true",
+                        help="run one shared embedding process instead of a model per worker")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    ctx = mp.get_context("fork")
+    embed_proc, embed_requests, embed_responses = None, None, None
+    if args.embed_service:
+        # One response queue per worker slot, plus one for the parent
+        embed_requests = ctx.Queue()
+        embed_responses = [ctx.Queue() for _ in range(args.workers + 1)]
+        embed_proc = ctx.Process(target=serve_embeddings, args=(EMBED_MODEL, embed_requests, embed_responses),
+                                 name="embed-service", daemon=True)
+        embed_proc.start()
+        set_embedder(RemoteEmbedder(args.workers, embed_requests, embed_responses[args.workers]))
+
+    log.info("Preloading shared assets in parent (pid %d)", os.getpid())
+    preload(load_model=not args.embed_service)
+    # main splits its admission/rate limits across this many workers
+    os.environ["SERVER_WORKERS"] = str(args.workers)
+    import main as _app  # noqa: F401  (import once so workers inherit the modules)
+
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((args.host, args.port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+
+    # Keep preloaded objects out of GC passes so workers don't dirty (copy) them
+    gc.collect()
+    gc.freeze()
+
+    workers = {}
+
+    def spawn(worker_id: int):
+        p = ctx.Process(target=run_worker, args=(sock, worker_id, args, embed_requests, embed_responses),
+                        name=f"worker-{worker_id}")
+        p.start()
+        workers[p.sentinel] = (worker_id, p)
+        log.info("Started worker %d (pid %d)", worker_id, p.pid)
+
+    for i in range(args.workers):
+        spawn(i)
+    log.info("Serving on http://%s:%d with %d workers", args.host, args.port, args.workers)
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for _, p in workers.values():
+            if p.is_alive():
+                p.terminate()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while workers:
+        for sentinel in wait(list(workers)):
+            worker_id, p = workers.pop(sentinel)
+            p.join()
+            if not stopping:
+                log.warning("Worker %d exited with %s, restarting", worker_id, p.exitcode)
+                spawn(worker_id)
+
+    if embed_proc is not None:
+        embed_requests.put(None)
+        embed_proc.join(timeout=5)
+    sock.close()
+
+
+if __name__ == "__main__":
+    main()
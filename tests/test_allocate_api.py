@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from agents import master_agent
+from agents.smart_allocator import allocate_spectrum
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    # Small dataset and writable data/ dir; no RAG model, index or policy endpoint
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    (tmp_path / "data" / "PanIndia_energy.csv").write_text(
+        "Jio_Cluster,Bandwidth_MHz,Power_Usage_kW,Energy_Consumption_kWh\n"
+        "Kerala,40,4,200\n"
+        "Kerala,60,6,300\n"
+        "Punjab,20,5,250\n"
+        "Gujarat,80,3,150\n"
+    )
+
+    async def check_policy(request_data):
+        return {"compliant": True}
+
+    monkeypatch.setattr(master_agent, "retrieve", lambda query, top_k=5: [])
+    monkeypatch.setattr(main.master, "policy_checker", check_policy)
+    main.warmup_done.set()
+    return TestClient(main.app)
+
+
+def test_allocate_without_optional_fields(client):
+    # Same shape as the frontend sends: alpha, seed, mode, ... all omitted
+    res = client.post("/allocate", json={"regions": ["Kerala", "Punjab", "Gujarat"], "bands": ["low", "mid", "high"]})
+
+    assert res.status_code == 200, res.text
+    result = res.json()["result"]
+    assert result["status"] == "Accepted"
+    assert set(result["result"]["allocation"]["allocation_map"]) == {"Kerala", "Punjab", "Gujarat"}
+    assert 0.0 < result["result"]["fairness"]["jain"] <= 1.0
+
+
+def test_allocate_rejects_negative_seed(client):
+    res = client.post("/allocate", json={"regions": ["Kerala"], "bands": ["low"], "seed": -1})
+
+    assert res.status_code == 422
+
+
+def test_allocate_caps_solver_sizes(client):
+    base = {"regions": ["Kerala"], "bands": ["low"], "mode": "pareto"}
+
+    assert client.post("/allocate", json={**base, "pop_size": 100_000}).status_code == 422
+    assert client.post("/allocate", json={**base, "generations": 10**9}).status_code == 422
+    assert client.post("/allocate", json={**base, "time_budget_s": 3600}).status_code == 422
+
+
+def test_rate_limit_ignores_client_supplied_id(client, monkeypatch):
+    from utils.admission import RateLimiter
+
+    monkeypatch.setattr(main, "rate_limiter", RateLimiter(0.001, 1))
+    body = {"regions": ["Kerala"], "bands": ["low"]}
+
+    assert client.post("/allocate", json=body, headers={"x-client-id": "a"}).status_code == 200
+    assert client.post("/allocate", json=body, headers={"x-client-id": "b"}).status_code == 429
+
+
+def test_spatial_pop_size_below_two(client):
+    body = {"regions": ["Kerala", "Punjab"], "bands": ["low", "mid"], "mode": "spatial",
+            "edges": [["Kerala", "Punjab"]], "pop_size": 1}
+
+    assert client.post("/allocate", json=body).status_code == 422
+
+    # Callers that bypass the API (CLI, replay) are clamped instead of failing
+    result = asyncio.run(allocate_spectrum(body, log_replay=False))
+    assert result["solver"]["mode"] == "spatial"
+    assert len(result["band_indices"]) == 2
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+
+from rag_backend.lexical import BM25Index, corpus_stats  # noqa: E402
+from rag_backend.shards import ShardedIndex  # noqa: E402
+
+DIM = 8
+
+
+def _doc(i, doc_type, text):
+    return {"id": f"{doc_type}-{i}", "text": text, "source": f"https://example.org/{doc_type}", "doc_type": doc_type}
+
+
+def _vec(*components):
+    v = np.zeros(DIM, dtype=np.float32)
+    for axis, value in components:
+        v[axis] = value
+    return v
+
+
+def test_global_bm25_matches_unsharded_scores():
+    texts = [
+        "spectrum auction for the 26 GHz band",
+        "spectrum usage charges",
+        "spectrum spectrum spectrum",
+        "licence fee for 3300-3670 MHz",
+        "backhaul links in the E band",
+    ]
+    parts = [BM25Index.build(texts[:2]), BM25Index.build(texts[2:3]), BM25Index.build(texts[3:])]
+    query = "spectrum for 26 GHz"
+
+    corpus = corpus_stats(parts, query)
+    sharded = np.concatenate([p.scores(query, corpus) for p in parts])
+
+    np.testing.assert_allclose(sharded, BM25Index.build(texts).scores(query), rtol=1e-5)
+
+
+def test_generic_lexical_hits_do_not_displace_vector_hits(tmp_path):
+    # consultation-1/2 are close to the query vector but share no terms with it
+    docs = [
+        _doc(0, "consultation", "Consultation on the 26 GHz spectrum band"),
+        _doc(1, "consultation", "Consultation paper on millimetre wave backhaul and reserve prices"),
+        _doc(2, "consultation", "Consultation paper on satellite earth stations near airports"),
+    ]
+    vectors = [_vec((0, 1.0)), _vec((0, 1.0), (1, 0.1)), _vec((0, 1.0), (1, 0.2))]
+    # Generic "spectrum" chunks spread over other shards, far from the query vector
+    for doc_type in ("notice", "regulation", "report"):
+        for i in range(3):
+            docs.append(_doc(i, doc_type, f"Spectrum notice {i}"))
+            vectors.append(_vec((3, 1.0), (4, 0.1 * i)))
+
+    index = ShardedIndex(tmp_path / "shards", shard_by="doc_type", index_type="flat")
+    index.build(docs, np.stack(vectors))
+
+    ids = [h["id"] for h in index.search(_vec((0, 1.0))[None, :], "spectrum for 26 GHz", top_k=3)]
+
+    # One merged lexical ranking: only its runner-up competes with vector hit #2
+    assert ids[:2] == ["consultation-0", "consultation-1"]
@@ -0,0 +1,133 @@
+# utils/admission.py
+import json
+import time
+import asyncio
+import hashlib
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Dict, Iterable, Optional
+
+
+class Overloaded(Exception):
+    """Raised when a request cannot be admitted (queue full or wait timed out)."""
+
+
+# -----------------------------
+# Canonical request keys
+# -----------------------------
+def canonical_key(payload: dict, ignore: Iterable[str] = ("request_id",)) -> str:
+    """
+    Stable hash of a request payload: keys sorted, None values and
+    per-call identifiers dropped, so equivalent requests share a key.
+    """
+    skip = set(ignore)
+    body = {k: v for k, v in payload.items() if k not in skip and v is not None}
+    blob = json.dumps(body, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+
+# -----------------------------
+# Single-flight coalescing
+# -----------------------------
+class SingleFlight:
+    """
+    Concurrent callers with the same key share one in-flight computation;
+    the key is released as soon as it completes (no result caching).
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def __len__(self):
+        return len(self._inflight)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable]):
+        fut = self._inflight.get(key)
+        if fut is None:
+            fut = asyncio.ensure_future(fn())
+            self._inflight[key] = fut
+            fut.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shield so one cancelled caller does not cancel the shared work
+        return await asyncio.shield(fut)
+
+
+# -----------------------------
+# Bounded concurrency + queue
+# -----------------------------
+class AdmissionController:
+    """
+    At most `max_concurrency` requests run at once and at most `max_queue`
+    wait for a slot; anything beyond that is shed immediately.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout_s: Optional[float] = None):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout_s = queue_timeout_s
+        self._sem = asyncio.Semaphore(max_concurrency)
+        self.waiting = 0
+        self.running = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        # Counters are updated before any await, so this check is exact
+        if self.running + self.waiting >= self.max_concurrency + self.max_queue:
+            raise Overloaded("queue full")
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._sem.acquire(), timeout=self.queue_timeout_s)
+        except asyncio.TimeoutError:
+            raise Overloaded("timed out waiting for a slot")
+        finally:
+            self.waiting -= 1
+        self.running += 1
+        try:
+            yield
+        finally:
+            self.running -= 1
+            self._sem.release()
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "waiting": self.waiting,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+        }
+
+
+# -----------------------------
+# Per-client token bucket
+# -----------------------------
+class RateLimiter:
+    """
+    Token bucket per client: `rate` requests/second with bursts up to `burst`.
+    Only the most recently seen `max_clients` buckets are kept.
+    """
+
+    def __init__(self, rate: float, burst: int, max_clients: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+
+    def allow(self, client: str) -> bool:
+        if self.rate <= 0:
+            return True
+        now = time.monotonic()
+        bucket = self._buckets.pop(client, None)
+        if bucket is None:
+            bucket = [float(self.burst), now]
+        tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        allowed = tokens >= 1.0
+        bucket[0], bucket[1] = (tokens - 1.0 if allowed else tokens), now
+        self._buckets[client] = bucket
+        if len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+        return allowed
+
+    def retry_after(self, client: str) -> float:
+        bucket = self._buckets.get(client)
+        if bucket is None or self.rate <= 0:
+            return 0.0
+        return max(0.0, (1.0 - bucket[0]) / self.rate)
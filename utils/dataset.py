@@ -0,0 +1,356 @@
+# utils/dataset.py
+"""
+Typed, columnar storage for the PanIndia energy dataset.
+
+The CSV is converted once into time-partitioned Parquet files under
+data/energy/, with Jio_Cluster dictionary-encoded (pandas categorical) and
+the metrics stored as float32:
+
+    python -m utils.dataset convert data/PanIndia_energy.csv
+    python -m utils.dataset append new_telemetry.csv
+
+Appended partitions are picked up by EnergyDataset.refresh() without
+re-reading the files already loaded. Without pyarrow, or before the
+conversion has been run, the CSV is read directly with the same dtypes.
+"""
+import os
+import glob
+import logging
+import argparse
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_numeric_dtype, union_categoricals
+
+log = logging.getLogger("energy-dataset")
+
+CSV_PATH = os.path.join("data", "PanIndia_energy.csv")
+DATASET_DIR = os.getenv("ENERGY_DATASET_DIR", os.path.join("data", "energy"))
+PARTITION_PREFIX = "energy-"
+
+CLUSTER_COLUMN = "Jio_Cluster"
+# Lower-cased copy of Jio_Cluster; region filters match on it case-insensitively
+CLUSTER_KEY = "cluster_key"
+METRIC_COLUMNS = ["Bandwidth_MHz", "Power_Usage_kW", "Energy_Consumption_kWh"]
+COORDINATE_COLUMNS = ["Latitude", "Longitude"]
+
+
+def pyarrow_available() -> bool:
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def cluster_key(name) -> str:
+    return str(name).lower()
+
+
+# -----------------------------
+# Storage schema
+# -----------------------------
+def typed_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Cast to the storage schema: categorical clusters, float32 numerics, missing values as 0."""
+    out = pd.DataFrame(index=pd.RangeIndex(len(df)))
+    for col in df.columns:
+        values = df[col].reset_index(drop=True)
+        if col == CLUSTER_COLUMN:
+            names = values.fillna("0").astype(str)
+            out[CLUSTER_COLUMN] = names.astype("category")
+            out[CLUSTER_KEY] = names.str.lower().astype("category")
+        elif col == CLUSTER_KEY:
+            continue
+        elif col in METRIC_COLUMNS or is_numeric_dtype(values):
+            out[col] = pd.to_numeric(values, errors="coerce").fillna(0).astype(np.float32)
+        else:
+            out[col] = values.fillna(0)
+    return out
+
+
+def read_csv_typed(path: str = CSV_PATH, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Read the CSV with storage dtypes, parsing only `columns` when given."""
+    header = pd.read_csv(path, nrows=0).columns
+    usecols = [c for c in header if columns is None or c in columns or (c == CLUSTER_COLUMN and CLUSTER_KEY in columns)]
+    dtype = {c: np.float32 for c in METRIC_COLUMNS if c in usecols}
+    if CLUSTER_COLUMN in usecols:
+        dtype[CLUSTER_COLUMN] = "category"
+    return typed_frame(pd.read_csv(path, usecols=usecols, dtype=dtype))
+
+
+# -----------------------------
+# Partitions
+# -----------------------------
+def partition_files(root: str = DATASET_DIR) -> List[str]:
+    """Partition files in time order (their names sort chronologically)."""
+    return sorted(glob.glob(os.path.join(root, f"{PARTITION_PREFIX}*.parquet")))
+
+
+def write_partition(df: pd.DataFrame, root: str = DATASET_DIR, ts: Optional[datetime] = None) -> str:
+    """Write `df` as a new time-stamped partition; the file appears atomically."""
+    ts = ts or datetime.now(timezone.utc)
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, f"{PARTITION_PREFIX}{ts.strftime('%Y%m%dT%H%M%S%fZ')}.parquet")
+    if os.path.exists(path):
+        raise FileExistsError(f"Partition already exists: {path}")
+    tmp = f"{path}.tmp"
+    typed_frame(df).to_parquet(tmp, engine="pyarrow", index=False)
+    os.replace(tmp, path)
+    log.info("Wrote partition %s (%d rows)", path, len(df))
+    return path
+
+
+def convert_csv(csv_path: str = CSV_PATH, root: str = DATASET_DIR) -> str:
+    """One-time conversion of the CSV into the base partition (stamped with the CSV's mtime)."""
+    if partition_files(root):
+        raise FileExistsError(f"{root} already holds partitions; use append for new data")
+    ts = datetime.fromtimestamp(os.path.getmtime(csv_path), tz=timezone.utc)
+    return write_partition(read_csv_typed(csv_path), root, ts=ts)
+
+
+def partition_dataset(parts: List[str]):
+    """Arrow dataset over the partitions, with the union of their columns (absent ones read as null)."""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+
+    schema = pa.unify_schemas([pq.read_schema(p) for p in parts], promote_options="permissive")
+    return ds.dataset(parts, schema=schema, format="parquet")
+
+
+def read_clusters(regions: Iterable[str], columns: Optional[List[str]] = None,
+                  root: str = DATASET_DIR, csv_path: str = CSV_PATH) -> pd.DataFrame:
+    """
+    Rows for `regions` only. On Parquet partitions the cluster filter is
+    pushed down to the reader, so row groups of other clusters are skipped.
+    """
+    keys = sorted({cluster_key(r) for r in regions})
+    columns = list(columns or [CLUSTER_COLUMN, *METRIC_COLUMNS])
+    parts = partition_files(root)
+    if parts and pyarrow_available():
+        import pyarrow.dataset as ds
+
+        table = partition_dataset(parts).to_table(
+            columns=[c for c in dict.fromkeys(columns + [CLUSTER_KEY])],
+            filter=ds.field(CLUSTER_KEY).isin(keys),
+        )
+        return table.to_pandas()
+    df = read_csv_typed(csv_path, columns + [CLUSTER_KEY])
+    return df[df[CLUSTER_KEY].isin(keys)].reset_index(drop=True)
+
+
+def cluster_coordinates(regions: Iterable[str], root: str = DATASET_DIR,
+                        csv_path: str = CSV_PATH) -> Dict[str, tuple]:
+    """Mean (lat, lon) per region when the data has coordinate columns; {} otherwise."""
+    regions = list(regions)
+    parts = partition_files(root)
+    if parts and pyarrow_available():
+        available = set(partition_dataset(parts).schema.names)
+    elif os.path.exists(csv_path):
+        available = set(pd.read_csv(csv_path, nrows=0).columns)
+    else:
+        return {}
+    if not set(COORDINATE_COLUMNS) <= available:
+        return {}
+    df = read_clusters(regions, [CLUSTER_COLUMN, *COORDINATE_COLUMNS], root, csv_path)
+    # Partitions written before the coordinates were added read them as null
+    df = df.dropna(subset=COORDINATE_COLUMNS)
+    means = df.groupby(CLUSTER_KEY, observed=True)[COORDINATE_COLUMNS].mean()
+    return {
+        r: tuple(float(x) for x in means.loc[cluster_key(r)])
+        for r in regions if cluster_key(r) in means.index
+    }
+
+
+# -----------------------------
+# In-memory dataset
+# -----------------------------
+def _concat(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    """Concatenate partitions keeping categoricals categorical (unioned dictionaries)."""
+    if len(frames) == 1:
+        return frames[0]
+    merged = {}
+    for col in frames[0].columns:
+        if isinstance(frames[0][col].dtype, pd.CategoricalDtype):
+            merged[col] = pd.Series(union_categoricals([f[col] for f in frames]))
+        else:
+            merged[col] = pd.Series(np.concatenate([f[col].to_numpy() for f in frames]))
+    return pd.DataFrame(merged)
+
+
+class EnergyDataset:
+    """
+    Projected, typed view of the energy data, shared read-only by requests.
+
+    Besides the frame it keeps a dictionary-encoded cluster index (cluster
+    key -> row positions) and running per-cluster sums, so region lookups
+    never scan the cluster column and appended partitions only cost the
+    rows they add.
+    """
+
+    def __init__(self, root: str = DATASET_DIR, csv_path: str = CSV_PATH, columns: Optional[List[str]] = None):
+        self.root = root
+        self.csv_path = csv_path
+        self.columns = list(dict.fromkeys((columns or [CLUSTER_COLUMN, *METRIC_COLUMNS]) + [CLUSTER_KEY]))
+        self._lock = threading.Lock()
+        self._version = None          # dir mtime (partitions) or CSV mtime of what is loaded
+        self._source = None           # "parquet" | "csv"
+        self._loaded: List[str] = []
+        self._frames: List[pd.DataFrame] = []
+        self._frame: Optional[pd.DataFrame] = None
+        self._index: Dict[str, np.ndarray] = {}
+        self._sums = pd.DataFrame(dtype=np.float64)
+        self._counts = pd.Series(dtype=np.int64)
+
+    # ---- loading ----
+    def _source_version(self):
+        if pyarrow_available() and partition_files(self.root):
+            return "parquet", os.stat(self.root).st_mtime_ns
+        if os.path.exists(self.csv_path):
+            return "csv", os.path.getmtime(self.csv_path)
+        raise FileNotFoundError(f"Dataset not found at {self.csv_path} or {self.root}")
+
+    def refresh(self) -> "EnergyDataset":
+        """Load whatever changed since the last call; cheap when nothing did."""
+        source, version = self._source_version()
+        if source == self._source and version == self._version:
+            return self
+        with self._lock:
+            source, version = self._source_version()
+            if source == self._source and version == self._version:
+                return self
+            if source == "csv":
+                if self._source != "csv":
+                    log.info("Reading %s; run `python -m utils.dataset convert` for the columnar format",
+                             self.csv_path)
+                self._reset()
+                self._add(read_csv_typed(self.csv_path, self.columns))
+            else:
+                parts = partition_files(self.root)
+                if self._source != "parquet" or any(p not in parts for p in self._loaded):
+                    self._reset()     # first load, or partitions were removed/compacted
+                for path in parts:
+                    if path not in self._loaded:
+                        self._add(pd.read_parquet(path, columns=self._columns_in(path)))
+                        self._loaded.append(path)
+            self._frame = _concat(self._frames)
+            self._build_index()
+            self._source, self._version = source, version
+        return self
+
+    def _columns_in(self, path: str) -> List[str]:
+        import pyarrow.parquet as pq
+
+        available = set(pq.read_schema(path).names)
+        return [c for c in self.columns if c in available]
+
+    def _reset(self):
+        self._loaded, self._frames = [], []
+        self._sums = pd.DataFrame(dtype=np.float64)
+        self._counts = pd.Series(dtype=np.int64)
+
+    def _add(self, part: pd.DataFrame):
+        part = part.reset_index(drop=True)
+        self._frames.append(part)
+        metrics = [c for c in METRIC_COLUMNS if c in part.columns]
+        grouped = part.groupby(CLUSTER_KEY, observed=True)
+        self._sums = self._sums.add(grouped[metrics].sum().astype(np.float64), fill_value=0)
+        self._counts = self._counts.add(grouped.size(), fill_value=0)
+
+    def _build_index(self):
+        keys = self._frame[CLUSTER_KEY]
+        codes = keys.cat.codes.to_numpy()
+        order = np.argsort(codes, kind="stable")
+        bounds = np.searchsorted(codes[order], np.arange(len(keys.cat.categories) + 1))
+        self._index = {
+            str(k): order[bounds[i]:bounds[i + 1]] for i, k in enumerate(keys.cat.categories)
+        }
+
+    # ---- queries ----
+    def frame(self) -> pd.DataFrame:
+        """The whole projected frame; treat as read-only."""
+        return self.refresh()._frame
+
+    def rows(self, region: str) -> np.ndarray:
+        return self.refresh()._index.get(cluster_key(region), np.empty(0, dtype=np.int64))
+
+    def select(self, regions: Iterable[str], columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """Rows for `regions`, located through the cluster index."""
+        self.refresh()
+        positions = np.concatenate([self.rows(r) for r in regions] or [np.empty(0, dtype=np.int64)])
+        df = self._frame if columns is None else self._frame[columns]
+        return df.iloc[np.sort(positions)].reset_index(drop=True)
+
+    def cluster_means(self, regions: Iterable[str]) -> Dict[str, Optional[Dict[str, float]]]:
+        """Per-region metric means from the running sums; None for unknown regions."""
+        self.refresh()
+        out = {}
+        for region in regions:
+            key = cluster_key(region)
+            count = self._counts.get(key, 0)
+            if count:
+                out[region] = {m: float(self._sums.at[key, m] / count) for m in self._sums.columns}
+            else:
+                out[region] = None
+        return out
+
+    def fingerprint(self) -> Dict:
+        """What is loaded, cheaply: enough to tell whether two runs saw the same data."""
+        self.refresh()
+        return {
+            "source": self._source,
+            "partitions": [os.path.basename(p) for p in self._loaded],
+            "rows": int(len(self._frame)),
+        }
+
+    def stats(self) -> Dict:
+        self.refresh()
+        return {
+            "source": self._source,
+            "partitions": len(self._loaded),
+            "rows": int(len(self._frame)),
+            "clusters": len(self._index),
+            "memory_bytes": int(self._frame.memory_usage(deep=True).sum()),
+        }
+
+
+_datasets: Dict[tuple, EnergyDataset] = {}
+_datasets_lock = threading.Lock()
+
+
+def get_dataset(root: str = DATASET_DIR, csv_path: str = CSV_PATH) -> EnergyDataset:
+    """Process-wide dataset for (root, csv_path), refreshed on each call."""
+    key = (root, csv_path)
+    dataset = _datasets.get(key)
+    if dataset is None:
+        with _datasets_lock:
+            dataset = _datasets.setdefault(key, EnergyDataset(root, csv_path))
+    return dataset.refresh()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    convert = sub.add_parser("convert", help="convert the CSV into the base Parquet partition")
+    convert.add_argument("csv", nargs="?", default=CSV_PATH)
+    append = sub.add_parser("append", help="add a CSV of new telemetry as a new partition")
+    append.add_argument("csv")
+    for p in (convert, append):
+        p.add_argument("--root", default=DATASET_DIR)
+    sub.add_parser("stats", help="print what the dataset loads").add_argument("--root", default=DATASET_DIR)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    if args.command == "convert":
+        print(convert_csv(args.csv, args.root))
+    elif args.command == "append":
+        print(write_partition(read_csv_typed(args.csv), args.root))
+    else:
+        print(EnergyDataset(args.root).stats())
+
+
+if __name__ == "__main__":
+    main()